@@ -0,0 +1,346 @@
+"""
+Headless HTTP/JSON API of the expert chat pipeline, a plain ASGI application without Streamlit.
+
+Run it with any ASGI server, for example:
+    GROQ_API_KEY=... uvicorn api_server:app
+The default memory session store is private to one process, so several workers need the shared SQLite store:
+    GROQ_API_KEY=... SESSION_STORE_BACKEND=sqlite uvicorn api_server:app --workers 4
+Turns of one session are only serialized within a worker, a client should not send two questions of a session at once.
+
+Endpoints:
+    GET    /personas                 The expert catalog, ids and titles.
+    GET    /models                   The models a chat request can name, "auto" included, with their rolling latency and health.
+    POST   /chat                     Answer a question in a session, {"session_id", "answer"}.
+    POST   /chat/stream              Same request, the answer is streamed as server-sent events.
+    POST   /tts                      The audio of a text, in the format of the TTS backend.
+    GET    /sessions/{session_id}    The turns of a session.
+    DELETE /sessions/{session_id}    Forget a session.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import app as pipeline
+from audio_pipeline import submit_audio
+from groq_client import get_groq_client
+from groq_scheduler import CHAT_PRIORITY, DETECTION_PRIORITY, SUMMARY_PRIORITY, ScheduledClient
+from Gaccents import AccentList
+from languages import supported_languages
+from metrics import get_metrics
+from model_router import AUTO_MODEL, MODELS, ROUTER_TIMEOUT, get_model_router
+from personas import persona_store
+from session_store import get_session_store
+from speech_text import apply_audio_policy, to_speech_text
+from summarizer import schedule_summary
+from tts_backends import get_tts_backend
+
+
+# Defaults of a chat request, the same as the sidebar of app.py.
+DEFAULT_MODEL = os.environ.get("API_DEFAULT_MODEL", "llama3-70b-8192")
+# Expert id used when a request names none, the first expert of the catalog when unset.
+DEFAULT_PERSONA = os.environ.get("API_DEFAULT_PERSONA")
+DEFAULT_MEMORY_LENGTH = 5
+DEFAULT_TEMPERATURE = 0.5
+
+# Session locks kept by one server process, the least recently used are dropped past API_MAX_SESSIONS or after API_SESSION_TTL seconds.
+API_MAX_SESSIONS = int(os.environ.get("API_MAX_SESSIONS", "10000"))
+API_SESSION_TTL = float(os.environ.get("API_SESSION_TTL", str(24 * 60 * 60)))
+
+# Largest request body accepted, in bytes.
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class HTTPError(Exception):
+    """An error answered to the client with its status code and a JSON message."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class ApiSession:
+    """
+    One API conversation served by this process: its id and a lock serializing its turns.
+    The turns themselves live in the session store, so any replica sharing the store can serve the session.
+    """
+
+    __slots__ = ("session_id", "lock", "touched_at")
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.lock = asyncio.Lock()
+        self.touched_at = time.monotonic()
+
+    @property
+    def state(self):
+        return get_session_store().load(self.session_id)
+
+
+class ApiSessions:
+    """
+    The sessions of the API being served by this process, bounded in count and lifetime.
+    """
+
+    def __init__(self, max_sessions: int = API_MAX_SESSIONS, ttl: float = API_SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, session_id: str = None) -> ApiSession:
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id) if session_id else None
+            if session is not None and now - session.touched_at > self.ttl:
+                del self._sessions[session_id]
+                session = None
+            if session is None:
+                session = ApiSession(session_id or uuid.uuid4().hex)
+                self._sessions[session.session_id] = session
+            session.touched_at = now
+            self._sessions.move_to_end(session.session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        return get_session_store().delete(session_id)
+
+
+sessions = ApiSessions()
+
+
+def get_client(session_id: str, priority: int = CHAT_PRIORITY, timeout: float = None):
+    """Return the shared Groq client, its requests scheduled for session_id at priority and given up after timeout seconds."""
+    api_key = os.environ.get("GROQ_API_KEY")
+    if not api_key:
+        raise HTTPError(503, "GROQ_API_KEY is not set")
+    return ScheduledClient(get_groq_client(api_key), session_id, priority, timeout=timeout)
+
+
+async def read_json(receive) -> dict:
+    body = bytearray()
+    while True:
+        message = await receive()
+        body.extend(message.get("body", b""))
+        if len(body) > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        if not message.get("more_body"):
+            break
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        raise HTTPError(400, "Request body is not valid JSON")
+    if not isinstance(payload, dict):
+        raise HTTPError(400, "Request body must be a JSON object")
+    return payload
+
+
+async def send_response(send, status: int, body: bytes, content_type: str) -> None:
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type.encode("latin-1")), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send, status: int, payload) -> None:
+    await send_response(send, status, json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json")
+
+
+def server_sent_event(payload: dict) -> bytes:
+    return b"data: " + json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n\n"
+
+
+def session_id_field(payload: dict):
+    """Return the session_id of a request, None when it has none."""
+    session_id = payload.get("session_id")
+    if session_id is not None and (not isinstance(session_id, str) or not session_id):
+        raise HTTPError(400, "session_id must be a non-empty string")
+    return session_id
+
+
+def chat_request(payload: dict):
+    """Validate a chat request and return its question, expert, model, temperature and memory length."""
+    question = payload.get("question")
+    if not isinstance(question, str) or not question.strip():
+        raise HTTPError(400, "question is required")
+    persona_id = payload.get("persona", DEFAULT_PERSONA)
+    persona = persona_store.get(str(persona_id)) if persona_id is not None else persona_store.personas()[0]
+    if persona is None:
+        raise HTTPError(404, "Unknown persona %r" % persona_id)
+    try:
+        temperature = float(payload.get("temperature", DEFAULT_TEMPERATURE))
+        memory_length = int(payload.get("memory_length", DEFAULT_MEMORY_LENGTH))
+    except (TypeError, ValueError):
+        raise HTTPError(400, "temperature and memory_length must be numbers")
+    model = payload.get("model") or DEFAULT_MODEL
+    if model not in MODELS and model != AUTO_MODEL:
+        raise HTTPError(400, "Unknown model %r" % model)
+    return question, persona, model, temperature, max(memory_length, 1)
+
+
+def turn_prompt(session: ApiSession, question: str, persona, model: str, memory_length: int, native_history: bool):
+    """Return the chat prompt and the history messages of a turn, as main() builds them."""
+    if native_history:
+        return question, session.state.conversation.history_messages(question, model, persona.name, memory_length)
+    return session.state.conversation.build_prompt(question, model, persona.name, memory_length), ()
+
+
+def record_turn(session: ApiSession, question: str, answer: str) -> None:
+    get_session_store().append_turn(session.session_id, question, answer)
+
+
+async def personas_endpoint(scope, receive, send):
+    await send_json(send, 200, [{"id": persona.id, "title": persona.title} for persona in persona_store.personas()])
+
+
+async def models_endpoint(scope, receive, send):
+    await send_json(send, 200, get_model_router().stats())
+
+
+async def chat_endpoint(scope, receive, send):
+    payload = await read_json(receive)
+    question, persona, model, temperature, memory_length = chat_request(payload)
+    session = sessions.get_or_create(session_id_field(payload))
+    client = get_client(session.session_id, timeout=ROUTER_TIMEOUT)
+    turn = get_metrics().start_turn(model=model, persona=persona.id)
+    async with session.lock:
+        with turn.span("history"):
+            prompt, history_messages = turn_prompt(session, question, persona, model, memory_length, payload.get("native_history", True))
+        if payload.get("summarize", True):
+            schedule_summary(get_client(session.session_id, SUMMARY_PRIORITY), get_session_store(), session.session_id)
+        chat_messages = pipeline.build_chat_messages(persona.name, prompt, history_messages)
+        with turn.span("chat"):
+            answer = await asyncio.to_thread(get_model_router().complete, model, chat_messages, lambda routed_model: pipeline.chat_with_groq(
+                client, persona.name, prompt, routed_model, temperature, history_messages, turn.add_usage))
+        record_turn(session, question, answer)
+    turn.finish()
+    await send_json(send, 200, {"session_id": session.session_id, "answer": answer})
+
+
+async def chat_stream_endpoint(scope, receive, send):
+    payload = await read_json(receive)
+    question, persona, model, temperature, memory_length = chat_request(payload)
+    session = sessions.get_or_create(session_id_field(payload))
+    client = get_client(session.session_id, timeout=ROUTER_TIMEOUT)
+    turn = get_metrics().start_turn(model=model, persona=persona.id)
+    async with session.lock:
+        with turn.span("history"):
+            prompt, history_messages = turn_prompt(session, question, persona, model, memory_length, payload.get("native_history", True))
+        if payload.get("summarize", True):
+            schedule_summary(get_client(session.session_id, SUMMARY_PRIORITY), get_session_store(), session.session_id)
+        chat_messages = pipeline.build_chat_messages(persona.name, prompt, history_messages)
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")]})
+        # The Groq stream is a blocking iterator, each chunk is read on a worker thread so the event loop keeps serving.
+        # The next model takes over when the routed one fails before its first token.
+        deltas = turn.timed_stream("chat", get_model_router().stream(model, chat_messages, lambda routed_model: pipeline.chat_with_groq_stream(
+            client, persona.name, prompt, routed_model, temperature, history_messages, turn.add_usage)))
+        done = object()
+        chunks = []
+        try:
+            while True:
+                delta = await asyncio.to_thread(next, deltas, done)
+                if delta is done:
+                    break
+                chunks.append(delta)
+                await send({"type": "http.response.body", "more_body": True, "body": server_sent_event({"delta": delta})})
+        except Exception as error:
+            # The response has started, so a failed turn ends the stream with an error event and is not recorded.
+            await send({"type": "http.response.body", "body": server_sent_event({"error": "%s: %s" % (type(error).__name__, error)})})
+            return
+        record_turn(session, question, "".join(chunks))
+    turn.finish()
+    await send({"type": "http.response.body", "body": server_sent_event({"done": True, "session_id": session.session_id})})
+
+
+async def tts_endpoint(scope, receive, send):
+    payload = await read_json(receive)
+    text = payload.get("text")
+    if not isinstance(text, str) or not text.strip():
+        raise HTTPError(400, "text is required")
+    accent = payload.get("accent") or "com"
+    # The accent is the Google Translate domain gTTS requests, only the known ones are accepted.
+    if accent not in AccentList.values():
+        raise HTTPError(400, "Unknown accent %r" % accent)
+    try:
+        audio_limit = int(payload.get("audio_limit", 0))
+    except (TypeError, ValueError):
+        raise HTTPError(400, "audio_limit must be a number")
+    speech_text = apply_audio_policy(to_speech_text(text), payload.get("audio_policy", "Full answer"), audio_limit)
+    language = payload.get("language")
+    if language and language not in supported_languages:
+        raise HTTPError(400, "Unknown language %r" % language)
+    if language:
+        job = submit_audio(pipeline.convert_text_to_mp3, speech_text, language, accent)
+        audio = await asyncio.wrap_future(job)
+    else:
+        # The language is detected from the text, locally when possible and with the LLM otherwise.
+        client = get_client(session_id_field(payload) or "tts", DETECTION_PRIORITY)
+        job = submit_audio(pipeline.answer_to_mp3, client, text, speech_text, accent)
+        language, audio = await asyncio.wrap_future(job)
+    await send_response(send, 200, audio, get_tts_backend(pipeline.TTS_BACKEND).mime_type)
+
+
+async def session_endpoint(scope, receive, send, session_id: str):
+    if scope["method"] == "DELETE":
+        if not sessions.delete(session_id):
+            raise HTTPError(404, "Unknown session")
+        await send_json(send, 200, {"session_id": session_id, "deleted": True})
+        return
+    state = get_session_store().get(session_id)
+    transcript = state.conversation.transcript() if state is not None else []
+    if not transcript:
+        raise HTTPError(404, "Unknown session")
+    turns = [{"question": question, "answer": answer} for question, answer in transcript]
+    await send_json(send, 200, {"session_id": session_id, "turns": turns})
+
+
+ROUTES = {
+    ("GET", "/personas"): personas_endpoint,
+    ("GET", "/models"): models_endpoint,
+    ("POST", "/chat"): chat_endpoint,
+    ("POST", "/chat/stream"): chat_stream_endpoint,
+    ("POST", "/tts"): tts_endpoint,
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """
+    The ASGI application: routes each request to its endpoint and answers errors as JSON.
+    """
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    method, path = scope["method"], scope["path"].rstrip("/") or "/"
+    try:
+        endpoint = ROUTES.get((method, path))
+        if endpoint is not None:
+            await endpoint(scope, receive, send)
+        elif path.startswith("/sessions/") and method in ("GET", "DELETE"):
+            await session_endpoint(scope, receive, send, path[len("/sessions/"):])
+        else:
+            raise HTTPError(404, "Not found")
+    except HTTPError as error:
+        await send_json(send, error.status, {"error": error.message})
+    except Exception as error:
+        # Errors of the Groq API or of the TTS engine, the response may already have started for streams.
+        await send_json(send, 502, {"error": "%s: %s" % (type(error).__name__, error)})
@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+
+
+# How often, in seconds, a text corpus checks the modification time of its file.
+RELOAD_CHECK_INTERVAL = 5.0
+
+
+class TextCorpus:
+    """
+    The non-empty lines of a text file, loaded once and kept in memory.
+    The file is read again only when its modification time changes, checked at most every RELOAD_CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._lines = ()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def lines(self) -> tuple:
+        now = time.monotonic()
+        if self._mtime is not None and now - self._checked_at < RELOAD_CHECK_INTERVAL:
+            return self._lines
+        with self._lock:
+            if self._mtime is None or now - self._checked_at >= RELOAD_CHECK_INTERVAL:
+                mtime = os.stat(self.file_path).st_mtime
+                if mtime != self._mtime:
+                    with open(self.file_path, 'r') as f:
+                        self._lines = tuple(line.strip() for line in f if line.strip())
+                    self._mtime = mtime
+                self._checked_at = now
+        return self._lines
+
+
+_corpora = {}
+_images = {}
+_registry_lock = threading.Lock()
+
+
+def get_corpus(file_path: str) -> TextCorpus:
+    """
+    This function returns the process-wide corpus of a text file, such as the starter prompts or the latex formulas.
+    """
+    corpus = _corpora.get(file_path)
+    if corpus is None:
+        with _registry_lock:
+            corpus = _corpora.setdefault(file_path, TextCorpus(file_path))
+    return corpus
+
+
+def get_image(file_path: str, size: tuple):
+    """
+    This function returns an image decoded and resized once per process, shared read-only by every session.
+    """
+    key = (file_path, size)
+    image = _images.get(key)
+    if image is None:
+        with _registry_lock:
+            image = _images.get(key)
+            if image is None:
+                # Pillow is only imported by the first image decoded in the process.
+                from PIL import Image
+
+                with Image.open(file_path) as source:
+                    image = source.resize(size)
+                _images[key] = image
+    return image
@@ -0,0 +1,52 @@
+import asyncio
+import os
+import threading
+
+from audio_pipeline import split_into_segments
+
+
+# Concurrent segment syntheses allowed per answer on the event loop.
+TTS_SEGMENT_CONCURRENCY = int(os.environ.get("TTS_SEGMENT_WORKERS", "4"))
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    This function returns the process-wide event loop, started on a daemon thread on first use.
+    Every Streamlit session schedules its I/O on this loop, so one thread overlaps the waits of all sessions.
+    """
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="turn-event-loop", daemon=True)
+                thread.start()
+                _loop = loop
+    return _loop
+
+
+def run_coroutine(coroutine):
+    """
+    This function schedules a coroutine on the process-wide event loop and returns a concurrent.futures.Future,
+    the Streamlit script thread calls result() on it when it needs the value.
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, get_event_loop())
+
+
+async def synthesize_in_segments_async(text: str, synthesize_segment, max_chars: int = 250, join=b"".join) -> bytes:
+    """
+    This function is the coroutine version of audio_pipeline.synthesize_in_segments:
+    synthesize_segment is a coroutine function taking the text of one segment and returning its mp3 bytes,
+    at most TTS_SEGMENT_CONCURRENCY segments are synthesized at once and the mp3 frames are joined in order.
+    """
+    segments = split_into_segments(text, max_chars)
+    semaphore = asyncio.Semaphore(TTS_SEGMENT_CONCURRENCY)
+
+    async def bounded(segment):
+        async with semaphore:
+            return await synthesize_segment(segment)
+
+    return join(await asyncio.gather(*(bounded(segment) for segment in segments)))
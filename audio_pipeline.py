@@ -0,0 +1,72 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from speech_text import SENTENCE_BOUNDARY
+
+
+# Process-wide worker pool running language detection and speech synthesis off the Streamlit script thread,
+# so the answer is on screen while its audio is still being prepared.
+audio_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("AUDIO_WORKERS", "4")),
+    thread_name_prefix="audio",
+)
+
+
+def submit_audio(func, *args):
+    """
+    This function schedules an audio job on the worker pool and returns its Future.
+    The job must not touch st.session_state or any Streamlit element, the caller reads the result on the script thread.
+    """
+    return audio_executor.submit(func, *args)
+
+
+# Separate pool for the segments of one answer, so an audio job waiting on its segments can never starve them.
+segment_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("TTS_SEGMENT_WORKERS", "4")),
+    thread_name_prefix="tts-segment",
+)
+
+
+def split_into_segments(text: str, max_chars: int = 250) -> list:
+    """
+    This function splits a text into sentence-sized segments for speech synthesis.
+    Consecutive short sentences are merged up to max_chars, and sentences longer than max_chars are cut at word boundaries.
+    """
+    segments = []
+    current = ""
+    for sentence in SENTENCE_BOUNDARY.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            if current:
+                segments.append(current)
+                current = ""
+            segments.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            segments.append(current)
+            current = sentence
+        else:
+            current = current + " " + sentence if current else sentence
+    if current:
+        segments.append(current)
+    return segments
+
+
+def synthesize_in_segments(text: str, synthesize_segment, max_chars: int = 250, join=b"".join) -> bytes:
+    """
+    This function synthesizes a long text one segment at a time on the segment pool and concatenates the mp3 frames in order.
+    synthesize_segment takes the text of one segment and returns its mp3 bytes, the audio arrives in roughly the time of the slowest segment.
+    Formats that cannot be concatenated byte for byte, such as wav, pass their own join function.
+    """
+    segments = split_into_segments(text, max_chars)
+    if not segments:
+        return b""
+    if len(segments) == 1:
+        return synthesize_segment(segments[0])
+    futures = [segment_executor.submit(synthesize_segment, segment) for segment in segments]
+    return join([future.result() for future in futures])
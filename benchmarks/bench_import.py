@@ -0,0 +1,69 @@
+"""
+Import-time budget check of the app modules, each imported in a fresh interpreter.
+
+Run from the repository root:
+    python -m benchmarks.bench_import --budget-ms 250
+
+It fails when a module takes longer than the budget to import, prints anything, or eagerly imports a heavy dependency.
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+
+MODULES = ("app", "deleteapp", "edge_app")
+
+# Dependencies that must only be imported on first use.
+HEAVY_MODULES = ("streamlit", "groq", "httpx", "PIL", "gtts", "edge_tts", "http.server")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+sys.stderr.write(json.dumps({{"seconds": seconds, "heavy": [name for name in {heavy!r} if name in sys.modules]}}) + "\\n")
+"""
+
+
+def probe(module: str) -> dict:
+    """Import module in a fresh interpreter and return its import time, its output and the heavy modules it loaded."""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        capture_output=True, text=True, check=True,
+    )
+    report = json.loads(result.stderr.strip().splitlines()[-1])
+    report["stdout"] = result.stdout
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=250.0, help="import time allowed per module")
+    parser.add_argument("--repeat", type=int, default=5, help="imports per module, the fastest one is kept")
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    args = parser.parse_args()
+
+    failures = []
+    for module in args.modules:
+        reports = [probe(module) for _ in range(args.repeat)]
+        best_ms = min(report["seconds"] for report in reports) * 1000
+        heavy = sorted(set(name for report in reports for name in report["heavy"]))
+        printed = any(report["stdout"] for report in reports)
+        print("%-12s %8.1f ms%s%s" % (module, best_ms,
+                                      "  heavy: " + ", ".join(heavy) if heavy else "",
+                                      "  prints on import" if printed else ""))
+        if best_ms > args.budget_ms:
+            failures.append("%s imports in %.1f ms, over the %.0f ms budget" % (module, best_ms, args.budget_ms))
+        if heavy:
+            failures.append("%s eagerly imports %s" % (module, ", ".join(heavy)))
+        if printed:
+            failures.append("%s prints on import" % module)
+
+    for failure in failures:
+        print("FAIL: " + failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Benchmark of the per-turn pipeline of app.py against local stand-ins for Groq and for text to speech.
+
+Run from the repository root:
+    python -m benchmarks.bench_turn --sessions 8 --turns 5
+
+It reports p50/p95/p99 latency per stage, throughput at the given number of concurrent sessions
+and the memory held per session, without any network access.
+"""
+import argparse
+import gc
+import json
+import math
+import os
+import threading
+import time
+import tracemalloc
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stub_servers import start_groq_stub, start_tts_stub
+
+
+STAGES = ("history", "first_token", "chat", "detect", "sanitize", "tts", "turn")
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(pct / 100.0 * len(ordered)) - 1)]
+
+
+def make_stub_tts_backend(url: str):
+    """Return a TTS backend posting each segment to the stub TTS server."""
+    from tts_backends import TTSBackend
+
+    class StubTTSBackend(TTSBackend):
+        name = "stub"
+
+        def select_voice(self, language, accent=None):
+            return accent or "stub"
+
+        def synthesize(self, text, language, voice):
+            request = urllib.request.Request(url + "/synthesize", data=text.encode("utf-8"), method="POST")
+            with urllib.request.urlopen(request) as response:
+                return response.read()
+
+    return StubTTSBackend()
+
+
+class StageTimer:
+    """Collects the durations of every stage across sessions."""
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def report(self) -> dict:
+        return {
+            stage: {
+                "count": len(values),
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "mean_ms": (sum(values) / len(values) * 1000) if values else 0.0,
+            }
+            for stage, values in self.samples.items()
+        }
+
+
+def run_session(app, client, args, timer: StageTimer, questions: list) -> dict:
+    """Play args.turns turns of one session the way main() does, and return its session state."""
+    from session_store import TURN_RECORD, SessionState
+    from speech_text import apply_audio_policy, to_speech_text
+
+    session = SessionState("benchmark")
+    promptx = args.persona_prompt
+    for turn in range(args.turns):
+        user_question = questions[turn % len(questions)]
+        turn_start = time.perf_counter()
+
+        start = time.perf_counter()
+        if args.recap_history:
+            prompt = session.conversation.build_prompt(user_question, args.model, promptx, args.memory_length)
+            history_messages = ()
+        else:
+            prompt = user_question
+            history_messages = session.conversation.history_messages(user_question, args.model, promptx, args.memory_length)
+        timer.record("history", time.perf_counter() - start)
+
+        start = time.perf_counter()
+        chunks = []
+        for delta in app.chat_with_groq_stream(client, promptx, prompt, args.model, args.temperature, history_messages):
+            if not chunks:
+                timer.record("first_token", time.perf_counter() - start)
+            chunks.append(delta)
+        llm_answer = "".join(chunks)
+        timer.record("chat", time.perf_counter() - start)
+        session.apply(TURN_RECORD, (user_question, llm_answer))
+
+        start = time.perf_counter()
+        target_language = app.detect_source_language(client, llm_answer)
+        timer.record("detect", time.perf_counter() - start)
+
+        start = time.perf_counter()
+        speech_text = apply_audio_policy(to_speech_text(llm_answer), args.audio_policy, args.audio_limit)
+        timer.record("sanitize", time.perf_counter() - start)
+
+        start = time.perf_counter()
+        app.convert_text_to_mp3(speech_text, target_language, args.accent)
+        timer.record("tts", time.perf_counter() - start)
+
+        timer.record("turn", time.perf_counter() - turn_start)
+    return session
+
+
+def memory_per_session(sessions: list) -> float:
+    """Return the bytes allocated to rebuild the state of one session, with copies of its own strings."""
+    from session_store import TURN_RECORD, SessionState
+
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    rebuilt = []
+    for session in sessions:
+        state = SessionState(session.session_id)
+        for question, answer in session.conversation.transcript():
+            state.apply(TURN_RECORD, (question.encode("utf-8").decode("utf-8"), answer.encode("utf-8").decode("utf-8")))
+        rebuilt.append(state)
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return used / max(len(sessions), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent sessions")
+    parser.add_argument("--turns", type=int, default=5, help="turns per session")
+    parser.add_argument("--model", default="llama3-8b-8192")
+    parser.add_argument("--temperature", type=float, default=0.5)
+    parser.add_argument("--memory-length", type=int, default=5)
+    parser.add_argument("--recap-history", action="store_true", help="send the history as a recap prompt instead of chat messages")
+    parser.add_argument("--accent", default="com")
+    parser.add_argument("--audio-policy", default="Full answer")
+    parser.add_argument("--audio-limit", type=int, default=0)
+    parser.add_argument("--first-token-latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=300.0)
+    parser.add_argument("--answer-words", type=int, default=250)
+    parser.add_argument("--tts-latency", type=float, default=0.1, help="seconds per TTS request")
+    parser.add_argument("--tts-chars-per-second", type=float, default=2000.0)
+    parser.add_argument("--keep-caches", action="store_true", help="do not clear the TTS cache and language memo first")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+    args.persona_prompt = "You are the default Assistant for RJP Development Studio, a knowledgeable and friendly assistant."
+
+    groq_stub = start_groq_stub(args.first_token_latency, args.tokens_per_second, args.answer_words)
+    tts_stub = start_tts_stub(args.tts_latency, args.tts_chars_per_second)
+    os.environ["GROQ_BASE_URL"] = groq_stub.url
+    os.environ["TTS_BACKEND"] = "stub"
+
+    import app
+    from assets import get_corpus
+    from groq_client import create_groq_client
+    from language_detect import language_detector
+    from tts_backends import register_tts_backend
+    from tts_cache import tts_cache
+
+    register_tts_backend(make_stub_tts_backend(tts_stub.url))
+    app.TTS_BACKEND = "stub"
+    if not args.keep_caches:
+        tts_cache.clear()
+        language_detector.clear()
+    client = create_groq_client("benchmark")
+    questions = list(get_corpus("starter_prompt.txt").lines())
+
+    timer = StageTimer()
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+        futures = [executor.submit(run_session, app, client, args, timer, questions[index::args.sessions] or questions)
+                   for index in range(args.sessions)]
+        sessions = [future.result() for future in futures]
+    wall = time.perf_counter() - wall_start
+
+    report = {
+        "sessions": args.sessions,
+        "turns_per_session": args.turns,
+        "stages": timer.report(),
+        "throughput_turns_per_second": args.sessions * args.turns / wall,
+        "memory_per_session_bytes": memory_per_session(sessions),
+        "tts_cache": tts_cache.stats(),
+        "language_detection": {"local": language_detector.local_hits, "llm_fallbacks": language_detector.fallbacks},
+    }
+
+    print("%-12s %6s %10s %10s %10s %10s" % ("stage", "count", "p50 ms", "p95 ms", "p99 ms", "mean ms"))
+    for stage, stats in report["stages"].items():
+        print("%-12s %6d %10.1f %10.1f %10.1f %10.1f" % (stage, stats["count"], stats["p50_ms"], stats["p95_ms"], stats["p99_ms"], stats["mean_ms"]))
+    print("throughput: %.2f turns/s with %d sessions" % (report["throughput_turns_per_second"], args.sessions))
+    print("memory per session: %.1f KiB" % (report["memory_per_session_bytes"] / 1024))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Local stand-ins for the Groq chat completions API and for a text to speech service,
+with configurable latency and generation rate, so the turn pipeline can be measured without network access.
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+WORDS = (
+    "the expert answer model language token stream latency audio voice session history prompt persona "
+    "question context window budget cache request response server client quickly carefully simply because "
+    "however therefore example python streamlit groq speech sentence paragraph detail summary result"
+).split()
+
+
+def fake_answer(word_count: int) -> str:
+    """Return an English-looking answer of word_count words split into sentences."""
+    sentences = []
+    while word_count > 0:
+        length = min(word_count, random.randint(8, 18))
+        words = random.choices(WORDS, k=length)
+        sentences.append(" ".join(words).capitalize() + ".")
+        word_count -= length
+    return " ".join(sentences)
+
+
+class GroqStubHandler(BaseHTTPRequestHandler):
+    """Answers POST /openai/v1/chat/completions like the Groq API, streamed or not."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        settings = self.server.settings
+        answer = fake_answer(settings["answer_words"])
+        tokens = answer.split(" ")
+        prompt_tokens = sum(len(str(message.get("content", ""))) for message in request.get("messages", [])) // 4
+        completion_id = "chatcmpl-" + uuid.uuid4().hex
+        created = int(time.time())
+        model = request.get("model", "stub")
+        time.sleep(settings["first_token_latency"])
+
+        if request.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for index, token in enumerate(tokens):
+                delta = {"content": token if index == 0 else " " + token}
+                if index == 0:
+                    delta["role"] = "assistant"
+                self._write_event({"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                                   "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+                time.sleep(1.0 / settings["tokens_per_second"])
+            self._write_event({"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                               "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+            return
+
+        time.sleep(len(tokens) / settings["tokens_per_second"])
+        body = json.dumps({
+            "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_event(self, payload: dict) -> None:
+        self._write_chunk(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+class TTSStubHandler(BaseHTTPRequestHandler):
+    """Answers POST /synthesize with fake mp3 bytes, after a delay proportional to the text length."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        text = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        settings = self.server.settings
+        time.sleep(settings["latency"] + len(text) / settings["chars_per_second"])
+        # Roughly the size of 32 kbps speech at 15 characters per second.
+        body = b"\xff\xfb" + b"\x00" * (len(text) * 270)
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_server(handler, settings: dict) -> ThreadingHTTPServer:
+    """Start a stub server on a free local port in a daemon thread, its URL is server.url."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.settings = settings
+    server.url = "http://127.0.0.1:%d" % server.server_address[1]
+    threading.Thread(target=server.serve_forever, name=handler.__name__, daemon=True).start()
+    return server
+
+
+def start_groq_stub(first_token_latency: float = 0.2, tokens_per_second: float = 300.0, answer_words: int = 250) -> ThreadingHTTPServer:
+    return start_server(GroqStubHandler, {
+        "first_token_latency": first_token_latency,
+        "tokens_per_second": tokens_per_second,
+        "answer_words": answer_words,
+    })
+
+
+def start_tts_stub(latency: float = 0.1, chars_per_second: float = 2000.0) -> ThreadingHTTPServer:
+    return start_server(TTSStubHandler, {"latency": latency, "chars_per_second": chars_per_second})
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryCompletionBackend:
+    """
+    In-process backend, entries are kept in least-recently-used order up to max_entries.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, now: float) -> str:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, answer = entry
+            if expires_at < now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return answer
+
+    def put(self, key: str, answer: str, expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (expires_at, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCompletionBackend:
+    """
+    On-disk backend shared by every process on the host, the least recently used rows are deleted past max_entries.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            "key TEXT PRIMARY KEY, answer TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS completions_accessed_at ON completions (accessed_at)")
+
+    def get(self, key: str, now: float) -> str:
+        with self._lock:
+            row = self._connection.execute("SELECT answer, expires_at FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            answer, expires_at = row
+            if expires_at < now:
+                self._connection.execute("DELETE FROM completions WHERE key = ?", (key,))
+                return None
+            self._connection.execute("UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key))
+            return answer
+
+    def put(self, key: str, answer: str, expires_at: float) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO completions (key, answer, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, answer, expires_at, time.time()),
+            )
+            self._connection.execute(
+                "DELETE FROM completions WHERE key IN ("
+                "SELECT key FROM completions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+
+class CompletionCache:
+    """
+    Opt-in cache of chat completions, only used for deterministic requests made at temperature 0.
+    Entries are keyed on a hash of the model, the messages (system prompt included) and the temperature, and expire after ttl seconds.
+    """
+
+    def __init__(self, backend, ttl: float = 24 * 60 * 60):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def cacheable(temperature: float) -> bool:
+        return temperature == 0
+
+    @staticmethod
+    def key(model: str, messages: list, temperature: float) -> str:
+        payload = json.dumps([model, messages, temperature], ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, model: str, messages: list, temperature: float) -> str:
+        """Return the cached answer of a request, or None on a miss or when the request is not deterministic."""
+        if not self.cacheable(temperature):
+            return None
+        answer = self.backend.get(self.key(model, messages, temperature), time.time())
+        if answer is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return answer
+
+    def put(self, model: str, messages: list, temperature: float, answer: str) -> None:
+        """Store the answer of a deterministic request."""
+        if not self.cacheable(temperature) or not answer:
+            return
+        self.backend.put(self.key(model, messages, temperature), answer, time.time() + self.ttl)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.backend),
+        }
+
+
+def create_completion_cache() -> CompletionCache:
+    """
+    This function builds the completion cache from the environment:
+    COMPLETION_CACHE_BACKEND is "memory" (default) or "sqlite", stored at COMPLETION_CACHE_PATH,
+    COMPLETION_CACHE_MAX_ENTRIES bounds the entries and COMPLETION_CACHE_TTL is their lifetime in seconds.
+    """
+    max_entries = int(os.environ.get("COMPLETION_CACHE_MAX_ENTRIES", "1024"))
+    if os.environ.get("COMPLETION_CACHE_BACKEND", "memory") == "sqlite":
+        backend = SQLiteCompletionBackend(os.environ.get("COMPLETION_CACHE_PATH", "completion_cache.sqlite3"), max_entries)
+    else:
+        backend = MemoryCompletionBackend(max_entries)
+    return CompletionCache(backend, ttl=float(os.environ.get("COMPLETION_CACHE_TTL", str(24 * 60 * 60))))
+
+
+_completion_cache = None
+_completion_cache_lock = threading.Lock()
+
+
+def get_completion_cache() -> CompletionCache:
+    """
+    This function returns the process-wide completion cache, creating it on first use.
+    """
+    global _completion_cache
+    if _completion_cache is None:
+        with _completion_cache_lock:
+            if _completion_cache is None:
+                _completion_cache = create_completion_cache()
+    return _completion_cache
@@ -0,0 +1,101 @@
+import os
+import threading
+
+from groq_scheduler import get_scheduler
+
+
+# Connection pool, timeout and retry policy of the shared client, overridable from the environment.
+GROQ_MAX_CONNECTIONS = int(os.environ.get("GROQ_MAX_CONNECTIONS", "20"))
+GROQ_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("GROQ_MAX_KEEPALIVE_CONNECTIONS", "10"))
+GROQ_KEEPALIVE_EXPIRY = float(os.environ.get("GROQ_KEEPALIVE_EXPIRY", "60"))
+GROQ_TIMEOUT = float(os.environ.get("GROQ_TIMEOUT", "60"))
+GROQ_CONNECT_TIMEOUT = float(os.environ.get("GROQ_CONNECT_TIMEOUT", "5"))
+GROQ_MAX_RETRIES = int(os.environ.get("GROQ_MAX_RETRIES", "2"))
+# API endpoint, pointed at a local stand-in by the benchmarks.
+GROQ_BASE_URL = os.environ.get("GROQ_BASE_URL") or None
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def create_groq_client(api_key: str) -> "Groq":
+    """
+    This function builds a Groq client on top of a pooled, keep-alive httpx client.
+    The Groq SDK retries connection errors, 429 and 5xx responses GROQ_MAX_RETRIES times with exponential backoff,
+    except for the requests of groq_scheduler.ScheduledClient, whose retries the scheduler owns.
+    The groq and httpx packages are imported on first use, so importing this module stays cheap.
+    """
+    import httpx
+    from groq import Groq
+
+    http_client = httpx.Client(
+        # Every response reports the rate limits of its model to the request scheduler.
+        event_hooks={"response": [get_scheduler().observe_response]},
+        limits=httpx.Limits(
+            max_connections=GROQ_MAX_CONNECTIONS,
+            max_keepalive_connections=GROQ_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=GROQ_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(GROQ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT),
+    )
+    return Groq(
+        api_key=api_key,
+        base_url=GROQ_BASE_URL,
+        http_client=http_client,
+        max_retries=GROQ_MAX_RETRIES,
+        timeout=httpx.Timeout(GROQ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT),
+    )
+
+
+def get_groq_client(api_key: str) -> "Groq":
+    """
+    This function returns the process-wide Groq client of an API key, creating it on first use.
+    Every Streamlit rerun and session reuses the same client and its open connections.
+    """
+    client = _clients.get(api_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(api_key)
+            if client is None:
+                client = create_groq_client(api_key)
+                _clients[api_key] = client
+    return client
+
+
+_async_clients = {}
+
+
+def get_async_groq_client(api_key: str) -> "AsyncGroq":
+    """
+    This function returns the process-wide AsyncGroq client of an API key, creating it on first use.
+    It must only be awaited on the event loop of async_pipeline, where its connection pool lives.
+    """
+    client = _async_clients.get(api_key)
+    if client is None:
+        with _clients_lock:
+            client = _async_clients.get(api_key)
+            if client is None:
+                import httpx
+                from groq import AsyncGroq
+
+                async def observe_response(response):
+                    get_scheduler().observe_response(response)
+
+                http_client = httpx.AsyncClient(
+                    event_hooks={"response": [observe_response]},
+                    limits=httpx.Limits(
+                        max_connections=GROQ_MAX_CONNECTIONS,
+                        max_keepalive_connections=GROQ_MAX_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=GROQ_KEEPALIVE_EXPIRY,
+                    ),
+                    timeout=httpx.Timeout(GROQ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT),
+                )
+                client = AsyncGroq(
+                    api_key=api_key,
+                    base_url=GROQ_BASE_URL,
+                    http_client=http_client,
+                    max_retries=GROQ_MAX_RETRIES,
+                    timeout=httpx.Timeout(GROQ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT),
+                )
+                _async_clients[api_key] = client
+    return client
@@ -0,0 +1,396 @@
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from history import RESPONSE_TOKEN_RESERVE, estimate_tokens
+
+
+# Priorities of the Groq requests, lower runs first: the answer the user waits for, then detection, then summaries.
+CHAT_PRIORITY = 0
+DETECTION_PRIORITY = 1
+SUMMARY_PRIORITY = 2
+
+# Requests in flight at once across every session of the process.
+GROQ_MAX_CONCURRENT = int(os.environ.get("GROQ_MAX_CONCURRENT", "16"))
+# Attempts of a request failing with 429, 5xx or a connection error, and the bounds of the jittered exponential backoff.
+GROQ_SCHEDULER_ATTEMPTS = int(os.environ.get("GROQ_SCHEDULER_ATTEMPTS", "4"))
+GROQ_BACKOFF_BASE = float(os.environ.get("GROQ_BACKOFF_BASE", "0.5"))
+GROQ_BACKOFF_MAX = float(os.environ.get("GROQ_BACKOFF_MAX", "20"))
+
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+RETRYABLE_ERRORS = ("APIConnectionError", "APITimeoutError")
+
+
+def parse_duration(value: str) -> float:
+    """
+    This function parses the reset durations of the Groq rate limit headers, such as "2m59.56s" or "120ms", into seconds.
+    """
+    if not value:
+        return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        return sum(float(amount) * DURATION_SECONDS[unit] for amount, unit in DURATION_PART.findall(value))
+
+
+class ModelBudget:
+    """
+    What is left of the requests and tokens per minute of one model, as last reported by Groq,
+    minus what was admitted since then.
+    """
+
+    __slots__ = ("remaining_requests", "requests_reset_at", "remaining_tokens", "tokens_reset_at", "blocked_until")
+
+    def __init__(self):
+        self.remaining_requests = None
+        self.requests_reset_at = 0.0
+        self.remaining_tokens = None
+        self.tokens_reset_at = 0.0
+        self.blocked_until = 0.0
+
+    def ready_at(self, tokens: int, now: float) -> float:
+        """Return when a request of tokens tokens fits the budget, now or earlier when it fits already."""
+        ready = self.blocked_until
+        if self.remaining_requests is not None and self.remaining_requests <= 0 and now < self.requests_reset_at:
+            ready = max(ready, self.requests_reset_at)
+        if self.remaining_tokens is not None and tokens > self.remaining_tokens and now < self.tokens_reset_at:
+            ready = max(ready, self.tokens_reset_at)
+        return ready
+
+    def admit(self, tokens: int) -> None:
+        if self.remaining_requests is not None:
+            self.remaining_requests -= 1
+        if self.remaining_tokens is not None:
+            self.remaining_tokens -= tokens
+
+
+class Ticket:
+    __slots__ = ("priority", "tag", "seq", "model", "tokens")
+
+    def __init__(self, priority: int, tag: float, seq: int, model: str, tokens: int):
+        self.priority = priority
+        self.tag = tag
+        self.seq = seq
+        self.model = model
+        self.tokens = tokens
+
+    def order(self):
+        return (self.priority, self.tag, self.seq)
+
+
+class ScheduledStream:
+    """
+    A streamed chat completion holding its scheduler slot until it is exhausted, fails or is closed,
+    so streamed generations count against the concurrency limit for their whole duration.
+    """
+
+    def __init__(self, stream, release):
+        self._release = release
+        self._stream = stream
+        self._iterator = iter(stream)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._iterator)
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def close(self) -> None:
+        release, self._release = self._release, None
+        if release is not None:
+            try:
+                close = getattr(self._stream, "close", None)
+                if close is not None:
+                    close()
+            finally:
+                release()
+
+
+class RequestScheduler:
+    """
+    Process-wide gate of the Groq chat completions of every session.
+    Waiting requests are served by priority, then fairly across sessions: each session's requests get increasing
+    virtual start tags, so a busy session cannot starve the others. A request only starts when its model's
+    requests and tokens per minute, learnt from the x-ratelimit response headers, have room for it, and at most
+    max_concurrent requests run at once. 429, 5xx and connection errors are retried with full-jitter backoff,
+    honoring retry-after.
+    """
+
+    def __init__(self, max_concurrent: int = GROQ_MAX_CONCURRENT, max_attempts: int = GROQ_SCHEDULER_ATTEMPTS,
+                 backoff_base: float = GROQ_BACKOFF_BASE, backoff_max: float = GROQ_BACKOFF_MAX):
+        self.max_concurrent = max_concurrent
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retries = 0
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._budgets = {}
+        self._session_tags = {}
+        self._virtual_time = 0.0
+        self._running = 0
+        self._seq = itertools.count()
+
+    def _budget(self, model: str) -> ModelBudget:
+        budget = self._budgets.get(model)
+        if budget is None:
+            budget = self._budgets[model] = ModelBudget()
+        return budget
+
+    def _acquire(self, session_id: str, priority: int, model: str, tokens: int) -> None:
+        with self._condition:
+            tag = max(self._virtual_time, self._session_tags.get(session_id, 0.0)) + 1.0
+            self._session_tags[session_id] = tag
+            ticket = Ticket(priority, tag, next(self._seq), model, tokens)
+            self._waiting.append(ticket)
+            self._waiting.sort(key=Ticket.order)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wake_at = now + 1.0
+                    if self._running < self.max_concurrent:
+                        # The first waiting request whose model has room starts, a throttled model does not hold back the others.
+                        for candidate in self._waiting:
+                            ready_at = self._budget(candidate.model).ready_at(candidate.tokens, now)
+                            if ready_at <= now:
+                                if candidate is ticket:
+                                    self._start(ticket)
+                                    return
+                                break
+                            wake_at = min(wake_at, ready_at)
+                    self._condition.wait(max(wake_at - now, 0.01))
+            except BaseException:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    self._condition.notify_all()
+                raise
+
+    def _start(self, ticket: Ticket) -> None:
+        self._waiting.remove(ticket)
+        self._running += 1
+        self._virtual_time = max(self._virtual_time, ticket.tag - 1.0)
+        self._budget(ticket.model).admit(ticket.tokens)
+        # Sessions whose tags the virtual time caught up with no longer need one.
+        if len(self._session_tags) > 4 * self.max_concurrent + len(self._waiting):
+            self._session_tags = {session: tag for session, tag in self._session_tags.items() if tag > self._virtual_time}
+        self._condition.notify_all()
+
+    def _release(self) -> None:
+        with self._condition:
+            self._running -= 1
+            self._condition.notify_all()
+
+    def _retry_delay(self, error, attempt: int, retry_timeouts: bool = True) -> float:
+        """Return the seconds to wait before retrying after error, or None when it is not worth retrying."""
+        status = getattr(error, "status_code", None)
+        if status is None and type(error).__name__ not in RETRYABLE_ERRORS:
+            return None
+        if not retry_timeouts and type(error).__name__ == "APITimeoutError":
+            return None
+        if status is not None and status != 429 and status < 500:
+            return None
+        response = getattr(error, "response", None)
+        retry_after = parse_duration(response.headers.get("retry-after", "")) if response is not None else 0.0
+        backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return max(retry_after, backoff)
+
+    def call(self, session_id: str, priority: int, model: str, messages: list, request, stream: bool = False,
+             retry_timeouts: bool = True):
+        """
+        This function runs request, a callable sending one chat completion of model with messages, once the scheduler
+        admits it, and returns its result. Failed attempts are retried up to max_attempts times, timed out ones only
+        when retry_timeouts is set. A streamed result is returned as a ScheduledStream, which keeps the slot of the request until the stream ends.
+        """
+        tokens = sum(estimate_tokens(str(message.get("content", ""))) for message in messages) + RESPONSE_TOKEN_RESERVE
+        for attempt in range(self.max_attempts):
+            self._acquire(session_id, priority, model, tokens)
+            try:
+                result = request()
+            except Exception as error:
+                self._release()
+                delay = self._retry_delay(error, attempt, retry_timeouts)
+                if delay is None or attempt == self.max_attempts - 1:
+                    raise
+            except BaseException:
+                self._release()
+                raise
+            else:
+                if stream:
+                    return ScheduledStream(result, self._release)
+                self._release()
+                return result
+            self.retries += 1
+            time.sleep(delay)
+
+    async def _acquire_async(self, session_id: str, priority: int, model: str, tokens: int) -> None:
+        """Wait for a slot on a worker thread, so the event loop keeps serving the other sessions."""
+        acquired = asyncio.ensure_future(asyncio.to_thread(self._acquire, session_id, priority, model, tokens))
+        try:
+            await asyncio.shield(acquired)
+        except asyncio.CancelledError:
+            # The slot the thread still obtains for a cancelled request is handed back as soon as it is granted.
+            acquired.add_done_callback(lambda future: future.cancelled() or future.exception() or self._release())
+            raise
+
+    async def call_async(self, session_id: str, priority: int, model: str, messages: list, request, retry_timeouts: bool = True):
+        """
+        This function is the coroutine version of call for the AsyncGroq clients, request returns the awaitable
+        of one chat completion. Streamed completions are not supported.
+        """
+        tokens = sum(estimate_tokens(str(message.get("content", ""))) for message in messages) + RESPONSE_TOKEN_RESERVE
+        for attempt in range(self.max_attempts):
+            await self._acquire_async(session_id, priority, model, tokens)
+            try:
+                return await request()
+            except Exception as error:
+                delay = self._retry_delay(error, attempt, retry_timeouts)
+                if delay is None or attempt == self.max_attempts - 1:
+                    raise
+            finally:
+                self._release()
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    def ready_at(self, model: str, tokens: int) -> float:
+        """Return the monotonic time at which a request of tokens tokens fits the budget of model."""
+        with self._condition:
+            return self._budget(model).ready_at(tokens, time.monotonic())
+
+    def observe_response(self, response) -> None:
+        """
+        This function is the httpx response hook of the Groq clients: it updates the budget of the requested model
+        from the x-ratelimit headers, and blocks the model for retry-after seconds on a 429.
+        """
+        headers = response.headers
+        if "x-ratelimit-remaining-requests" not in headers and response.status_code != 429:
+            return
+        try:
+            model = json.loads(response.request.content).get("model")
+        except (ValueError, AttributeError):
+            return
+        now = time.monotonic()
+        with self._condition:
+            budget = self._budget(model)
+            if "x-ratelimit-remaining-requests" in headers:
+                budget.remaining_requests = int(headers["x-ratelimit-remaining-requests"])
+                budget.requests_reset_at = now + parse_duration(headers.get("x-ratelimit-reset-requests"))
+            if "x-ratelimit-remaining-tokens" in headers:
+                budget.remaining_tokens = int(headers["x-ratelimit-remaining-tokens"])
+                budget.tokens_reset_at = now + parse_duration(headers.get("x-ratelimit-reset-tokens"))
+            if response.status_code == 429:
+                budget.blocked_until = max(budget.blocked_until, now + parse_duration(headers.get("retry-after", "1")))
+            self._condition.notify_all()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "running": self._running,
+                "waiting": len(self._waiting),
+                "retries": self.retries,
+                "models": {model: {"remaining_requests": budget.remaining_requests, "remaining_tokens": budget.remaining_tokens}
+                           for model, budget in self._budgets.items()},
+            }
+
+
+class _Completions:
+    def __init__(self, scheduled_client):
+        self._scheduled_client = scheduled_client
+
+    def create(self, **kwargs):
+        scheduled = self._scheduled_client
+        if scheduled.timeout is not None:
+            kwargs.setdefault("timeout", scheduled.timeout)
+        return scheduled.scheduler.call(scheduled.session_id, scheduled.priority, kwargs.get("model"), kwargs.get("messages", []),
+                                        lambda: scheduled.client.chat.completions.create(**kwargs), kwargs.get("stream", False),
+                                        retry_timeouts=scheduled.timeout is None)
+
+
+class _AsyncCompletions:
+    def __init__(self, scheduled_client):
+        self._scheduled_client = scheduled_client
+
+    async def create(self, **kwargs):
+        scheduled = self._scheduled_client
+        if scheduled.timeout is not None:
+            kwargs.setdefault("timeout", scheduled.timeout)
+        return await scheduled.scheduler.call_async(scheduled.session_id, scheduled.priority, kwargs.get("model"), kwargs.get("messages", []),
+                                                    lambda: scheduled.client.chat.completions.create(**kwargs),
+                                                    retry_timeouts=scheduled.timeout is None)
+
+
+class _Chat:
+    def __init__(self, scheduled_client, completions=_Completions):
+        self.completions = completions(scheduled_client)
+
+
+class ScheduledClient:
+    """
+    Stand-in for a Groq client, passed to chat_with_groq and friends, whose chat completions go through the scheduler
+    on behalf of one session at one priority. The SDK's own retries are turned off, the scheduler owns them.
+    Each request gives up after timeout seconds when one is given, and a timed out request is not retried,
+    so the model router can move on to the next model.
+    """
+
+    def __init__(self, client, session_id: str, priority: int, scheduler: RequestScheduler = None, timeout: float = None):
+        self.client = _unretried_client(client)
+        self.session_id = session_id
+        self.priority = priority
+        self.timeout = timeout
+        self.scheduler = scheduler or get_scheduler()
+        self.chat = _Chat(self)
+
+
+class ScheduledAsyncClient(ScheduledClient):
+    """
+    Stand-in for an AsyncGroq client, its awaited chat completions go through the same scheduler as ScheduledClient.
+    """
+
+    def __init__(self, client, session_id: str, priority: int, scheduler: RequestScheduler = None, timeout: float = None):
+        super().__init__(client, session_id, priority, scheduler, timeout)
+        self.chat = _Chat(self, _AsyncCompletions)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+_unretried_clients = {}
+
+
+def _unretried_client(client):
+    """Return the copy of a shared Groq client without SDK retries, made once per client and sharing its connection pool."""
+    unretried = _unretried_clients.get(id(client))
+    if unretried is None or unretried[0] is not client:
+        with _scheduler_lock:
+            unretried = _unretried_clients[id(client)] = (client, client.with_options(max_retries=0))
+    return unretried[1]
+
+
+def get_scheduler() -> RequestScheduler:
+    """
+    This function returns the process-wide request scheduler, creating it on first use.
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = RequestScheduler()
+    return _scheduler
@@ -0,0 +1,214 @@
+import bisect
+import json
+import os
+import re
+import zlib
+from collections import deque
+from itertools import chain, islice
+
+
+BASE_PROMPT = """
+    Let's start our conversation, Please ask me a question!
+    """
+RECAP_HEADER = '''
+        As a recap, here is the current conversation:
+
+        '''
+SUMMARY_TEMPLATE = '''
+        Summary of the earlier conversation:
+        {summary}
+        '''
+QUESTION_TEMPLATE = '''
+            Human: {user_question}
+            AI:
+        '''
+
+# Context window used when the model name does not carry one, such as gemma-7b-it.
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Tokens kept free in the context window for the answer.
+RESPONSE_TOKEN_RESERVE = 1024
+
+# Turns kept in memory for the prompt window, at least the largest conversational memory of the sidebar.
+HISTORY_WINDOW = int(os.environ.get("HISTORY_WINDOW", "10"))
+
+# When set, the turns leaving the window are kept in a compressed archive of the full transcript.
+HISTORY_ARCHIVE = os.environ.get("HISTORY_ARCHIVE", "") not in ("", "0", "false")
+
+CONTEXT_WINDOW_PATTERN = re.compile(r"-(\d{4,6})(?:$|-)")
+WIDE_CHAR_PATTERN = re.compile("[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af\u0e00-\u0e7f]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    This function approximates the token count of a text without a tokenizer download:
+    about four characters per token, and one token per character for CJK, Hangul and Thai scripts.
+    """
+    wide = len(WIDE_CHAR_PATTERN.findall(text))
+    return wide + (len(text) - wide + 3) // 4
+
+
+def context_window(model: str) -> int:
+    """
+    This function returns the context window of a Groq model from its name, such as 8192 for llama3-8b-8192.
+    """
+    match = CONTEXT_WINDOW_PATTERN.search(model or "")
+    return int(match.group(1)) if match else DEFAULT_CONTEXT_WINDOW
+
+
+def token_budget(model: str, *prompt_parts: str) -> int:
+    """
+    This function returns the tokens left for the history in the context window of the model,
+    once the answer reserve and the other parts of the prompt are accounted for.
+    """
+    return context_window(model) - RESPONSE_TOKEN_RESERVE - sum(estimate_tokens(part) for part in prompt_parts)
+
+
+class TranscriptArchive:
+    """
+    The turns evicted from a conversation window, kept as one zlib stream compressed as the turns arrive.
+    Only the compressed bytes and the state of the compressor are held in memory.
+    """
+
+    def __init__(self, level: int = 6):
+        self.level = level
+        self.clear()
+
+    def __len__(self):
+        return self._turns
+
+    def append(self, user_question: str, chatbot_answer: str) -> None:
+        self._compressed.extend(self._compressor.compress(json.dumps([user_question, chatbot_answer]).encode("utf-8") + b"\n"))
+        self._turns += 1
+
+    def turns(self) -> list:
+        """Return the archived turns as (user question, chatbot answer) pairs, oldest first."""
+        data = zlib.decompress(bytes(self._compressed) + self._compressor.copy().flush())
+        return [tuple(json.loads(line)) for line in data.splitlines()]
+
+    def compressed_size(self) -> int:
+        return len(self._compressed)
+
+    def clear(self) -> None:
+        self._compressor = zlib.compressobj(self.level)
+        self._compressed = bytearray()
+        self._turns = 0
+
+
+class ConversationHistory:
+    """
+    The turns of one conversation, each rendered once as "Human: ...\\nAI: ..." with its token count.
+    A running token total lets build_prompt find the newest turns that fit the model budget without re-rendering the history.
+    Only the newest capacity turns are kept, in ring buffers, so the memory of a session does not grow with its length;
+    older turns are dropped, or compressed into archive when one is given.
+    Turns that no longer fit the prompt window can be folded into a running summary, sent ahead of the recap.
+    Turns leaving the ring buffers before the summary covers them wait for it in a pending buffer of the same capacity.
+    """
+
+    def __init__(self, capacity: int = HISTORY_WINDOW, archive: TranscriptArchive = None):
+        self.capacity = capacity
+        self.archive = archive
+        self.clear()
+
+    def __len__(self):
+        return len(self._lines)
+
+    def add_turn(self, user_question: str, chatbot_answer: str) -> None:
+        """Record a finished turn of the conversation, the oldest turn leaves the window when it is full."""
+        if len(self._turns) == self.capacity:
+            if self.archive is not None:
+                self.archive.append(*self._turns[0])
+            # The evicted turn is kept for the summary until it covers it.
+            if self.turn_count - self.capacity >= self.summarized_turns:
+                self._unsummarized.append(self._lines[0])
+        line = f"Human: {user_question}\nAI: {chatbot_answer}"
+        self._turns.append((user_question, chatbot_answer))
+        self._lines.append(line)
+        # The chat messages of the turn are built once and reused by every later request.
+        self._messages.append({"role": "user", "content": user_question})
+        self._messages.append({"role": "assistant", "content": chatbot_answer})
+        self.turn_count += 1
+        # The running total is never reset, so evicting the oldest entry keeps the differences between the others.
+        self._cumulative_tokens.append(self._cumulative_tokens[-1] + estimate_tokens(line) + 1)
+
+    def clear(self) -> None:
+        self._turns = deque(maxlen=self.capacity)
+        self._lines = deque(maxlen=self.capacity)
+        self._messages = deque(maxlen=2 * self.capacity)
+        self._cumulative_tokens = deque([0], maxlen=self.capacity + 1)
+        self._unsummarized = deque(maxlen=self.capacity)
+        # Turns added since the conversation started, including the ones that left the ring buffers.
+        self.turn_count = 0
+        # The running summary and the count of turns it covers, from the start of the conversation.
+        self.summary = ""
+        self.summarized_turns = 0
+        # Absolute index of the oldest turn sent with the last prompt, the turns before it are left to the summary.
+        self.window_begin = 0
+        if self.archive is not None:
+            self.archive.clear()
+
+    def transcript(self) -> list:
+        """Return every turn of the conversation, from the archive when there is one, as (user question, chatbot answer) pairs."""
+        archived = self.archive.turns() if self.archive is not None else []
+        return archived + list(self._turns)
+
+    def set_summary(self, summary: str, summarized_turns: int) -> None:
+        """Replace the running summary by one covering the first summarized_turns turns of the conversation."""
+        if summarized_turns >= self.summarized_turns:
+            self.summary = summary
+            self.summarized_turns = summarized_turns
+            first = self.turn_count - len(self._lines) - len(self._unsummarized)
+            for _ in range(min(summarized_turns - first, len(self._unsummarized))):
+                self._unsummarized.popleft()
+
+    def turns_to_summarize(self) -> tuple:
+        """
+        Return the turns before the last prompt window not yet in the summary, as lines, and the count of turns
+        the summary covers once they are folded into it.
+        """
+        first = self.turn_count - len(self._lines) - len(self._unsummarized)
+        start = max(self.summarized_turns, first)
+        end = max(self.window_begin, start)
+        return list(islice(chain(self._unsummarized, self._lines), start - first, end - first)), end
+
+    def _summary_text(self) -> str:
+        return SUMMARY_TEMPLATE.format(summary = self.summary) if self.summary else ""
+
+    def _record_window(self, start: int) -> int:
+        self.window_begin = self.turn_count - len(self._lines) + start
+        return start
+
+    def window_start(self, token_budget: int, max_turns: int) -> int:
+        """Return the index of the oldest turn kept when at most max_turns turns and token_budget tokens are allowed."""
+        end = len(self._lines)
+        start = max(0, end - max_turns)
+        # The first index whose suffix of turns fits the budget.
+        lowest_total = self._cumulative_tokens[end] - max(token_budget, 0)
+        return max(start, bisect.bisect_left(self._cumulative_tokens, lowest_total, 0, end + 1))
+
+    def build_prompt(self, user_question: str, model: str, system_prompt: str = "", conversational_memory_length: int = 10) -> str:
+        """
+        This function generates the full prompt for the chatbot from the newest turns that fit the context window of the model,
+        after reserving room for the system prompt, the new question and the answer.
+        """
+        question = QUESTION_TEMPLATE.format(user_question = user_question)
+        summary = self._summary_text()
+        budget = token_budget(model, system_prompt, BASE_PROMPT, summary, RECAP_HEADER, question)
+        start = self._record_window(self.window_start(budget, conversational_memory_length))
+        if start < len(self._lines):
+            return BASE_PROMPT + summary + RECAP_HEADER + "\n".join(islice(self._lines, start, None)) + question
+        return BASE_PROMPT + summary + question
+
+    def history_messages(self, user_question: str, model: str, system_prompt: str = "", conversational_memory_length: int = 10) -> list:
+        """
+        This function returns the newest turns that fit the context window of the model as alternating user and assistant messages,
+        to be sent between the system prompt and the new question so every request starts with the same message prefix.
+        The running summary, when there is one, comes first as a system message.
+        """
+        summary = self._summary_text()
+        budget = token_budget(model, system_prompt, summary, user_question)
+        start = self._record_window(self.window_start(budget, conversational_memory_length))
+        messages = list(islice(self._messages, 2 * start, None))
+        if summary:
+            messages.insert(0, {"role": "system", "content": summary.strip()})
+        return messages
@@ -0,0 +1,214 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+from languages import supported_languages
+
+
+# Confidence under which the local identification is not trusted and the LLM is asked instead.
+LOCAL_CONFIDENCE_THRESHOLD = 0.5
+
+# Number of weighted stopword hits needed before a Latin or Cyrillic guess is fully trusted.
+MIN_EVIDENCE = 4.0
+
+# Scripts used by a single supported language, checked before any word statistics.
+SCRIPT_RANGES = (
+    ("Korean", ((0xAC00, 0xD7AF), (0x1100, 0x11FF), (0x3130, 0x318F))),
+    ("Japanese", ((0x3040, 0x309F), (0x30A0, 0x30FF))),
+    ("Thai", ((0x0E00, 0x0E7F),)),
+    ("Arabic", ((0x0600, 0x06FF), (0x0750, 0x077F))),
+    ("Hebrew", ((0x0590, 0x05FF),)),
+    ("Greek", ((0x0370, 0x03FF),)),
+)
+HAN_RANGES = ((0x4E00, 0x9FFF), (0x3400, 0x4DBF))
+CYRILLIC_RANGE = (0x0400, 0x04FF)
+
+STOPWORDS = {
+    "English": "the and is are of to that it you for with this was have be not on as your what can will there they",
+    "Spanish": "el la los las de que y en es por para con una un del se no su como pero más está muy también usted",
+    "Portuguese": "o os as de que e em é não uma um do da para com por você mais são também isso muito está",
+    "Italian": "il lo gli le di che e è non per una un del della sono con come anche questo ma più molto",
+    "French": "le la les de des et est que une un dans pour pas vous qui sur avec ce il je nous sont très",
+    "German": "der die das und ist nicht ich sie es ein eine zu mit den von auf für sich auch dem wir",
+    "Dutch": "de het een en van is niet ik je dat die op te met voor zijn er maar ook wat",
+    "Danish": "og i er det at en til på med for ikke de af som den jeg har du vi om hvad også",
+    "Norwegian": "og i er det at en til på med for ikke av som den jeg har du vi om hva også",
+    "Swedish": "och i är det att en som på med för inte av till jag du vi har den om också eller",
+    "Finnish": "ja on ei se että oli kun mutta tämä hän ovat myös kuin niin voi sinä minä olen mitä",
+    "Estonian": "ja on ei see et oli kui aga ta nad ka mis ma sa olen oma siis seda",
+    "Hungarian": "a az és hogy nem is egy van meg ez de csak már mint vagy volt még",
+    "Polish": "i w na nie się że to jest z do jak co ale tak o dla jestem są czy",
+    "Romanian": "și în de la nu este cu o un că pe pentru mai sunt care ce din sau",
+    "Croatian": "i je u na da se su za ne od koji to kao ali sam što biti",
+    "Turkish": "ve bir bu da de için ile ne çok daha gibi olarak ama var değil ben sen",
+    "Indonesian": "dan yang di ini itu dengan untuk tidak dari dalam akan ada saya anda adalah juga ke",
+    "Icelandic": "og að er í á það ekki við sem til en um ég þú hann var með",
+    "Vietnamese": "và của là có không được những một các trong cho tôi bạn này với người",
+    "Russian": "и в не на что я с он это как по но вы мы так они",
+    "Bulgarian": "и в не на че да се е за от съм това са как но вие ние",
+}
+
+# Letters that only a few supported languages use, each occurrence counts as one weighted hit.
+DISTINCTIVE_LETTERS = {
+    "ñ¿¡": ("Spanish",),
+    "ãõ": ("Portuguese", "Estonian"),
+    "ß": ("German",),
+    "øæ": ("Danish", "Norwegian"),
+    "őű": ("Hungarian",),
+    "łąęśźż": ("Polish",),
+    "șțăâî": ("Romanian",),
+    "ğşı": ("Turkish",),
+    "ðþ": ("Icelandic",),
+    "đ": ("Croatian", "Vietnamese"),
+    "ơưạảấầẩẫậắằẳẵặẹẻẽếềểễệỉịọỏốồổỗộớờởỡợụủứừửữựỳỵỷỹ": ("Vietnamese",),
+    "ыэё": ("Russian",),
+    "ъ": ("Bulgarian",),
+}
+
+WORD_PATTERN = re.compile(r"[^\W\d_]+")
+
+
+def _build_weights():
+    """Weight every stopword by how few languages share it, so common overlaps count for little."""
+    owners = {}
+    for language, words in STOPWORDS.items():
+        for word in set(words.split()):
+            owners.setdefault(word, []).append(language)
+    return {word: {language: 1.0 / len(languages) for language in languages} for word, languages in owners.items()}
+
+
+STOPWORD_WEIGHTS = _build_weights()
+LETTER_OWNERS = {letter: languages for letters, languages in DISTINCTIVE_LETTERS.items() for letter in letters}
+
+
+def _in_ranges(code_point, ranges) -> bool:
+    return any(low <= code_point <= high for low, high in ranges)
+
+
+def _script_language(text: str):
+    """Return the language written in a single-language script, or None for Latin and Cyrillic text."""
+    han = 0
+    letters = 0
+    for char in text:
+        if not char.isalpha():
+            continue
+        letters += 1
+        code_point = ord(char)
+        if code_point < 0x0370:
+            continue
+        for language, ranges in SCRIPT_RANGES:
+            if _in_ranges(code_point, ranges):
+                return language
+        if _in_ranges(code_point, HAN_RANGES):
+            han += 1
+    if letters and han * 2 >= letters:
+        return "Chinese"
+    return None
+
+
+def identify_language(text: str) -> Tuple[str, float]:
+    """Identify the language of a text locally, without any network call
+    :type text: str
+    :param text: Source text to detect language
+    :rtype: tuple
+    :returns: The supported_languages name of the language and a confidence between 0 and 1
+    """
+    script_language = _script_language(text)
+    if script_language:
+        return script_language, 1.0
+
+    scores = {}
+    lowered = text.lower()
+    for word in WORD_PATTERN.findall(lowered):
+        for language, weight in STOPWORD_WEIGHTS.get(word, {}).items():
+            scores[language] = scores.get(language, 0.0) + weight
+    for char in lowered:
+        for language in LETTER_OWNERS.get(char, ()):
+            scores[language] = scores.get(language, 0.0) + 1.0
+    cyrillic = any(CYRILLIC_RANGE[0] <= ord(char) <= CYRILLIC_RANGE[1] for char in lowered)
+    if cyrillic:
+        scores = {language: score for language, score in scores.items() if language in ("Russian", "Bulgarian")}
+        scores.setdefault("Russian", 0.0)
+
+    if not scores:
+        return "English", 0.0
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    best_language, best = ranked[0]
+    second = ranked[1][1] if len(ranked) > 1 else 0.0
+    if best <= 0:
+        return best_language, 0.0
+    margin = (best - second) / best
+    return best_language, margin * min(1.0, best / MIN_EVIDENCE)
+
+
+class LanguageDetector:
+    """
+    Resolves the language of answers against supported_languages, trying the local identifier first
+    and remembering the result of each text so the same answer is never detected twice.
+    """
+
+    def __init__(self, max_entries: int = 1024, threshold: float = LOCAL_CONFIDENCE_THRESHOLD):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.local_hits = 0
+        self.fallbacks = 0
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    def detect(self, text: str, fallback=None) -> str:
+        """Detect the language of text
+        :type text: str
+        :param text: Source text to detect language
+        :type fallback: callable
+        :param fallback: Function without arguments returning the language name, called when the local guess is not confident
+        :rtype: str
+        :returns: Detected language of source text
+        """
+        text_hash, language, confident = self._local_guess(text)
+        if not confident and fallback is not None:
+            language = fallback()
+            self.fallbacks += 1
+        return self._remember(text_hash, language)
+
+    async def detect_async(self, text: str, fallback=None) -> str:
+        """Same as detect, for a fallback that is a coroutine function."""
+        text_hash, language, confident = self._local_guess(text)
+        if not confident and fallback is not None:
+            language = await fallback()
+            self.fallbacks += 1
+        return self._remember(text_hash, language)
+
+    def clear(self) -> None:
+        """Forget every memoized detection and reset the counters."""
+        with self._lock:
+            self._memo.clear()
+            self.local_hits = 0
+            self.fallbacks = 0
+
+    def _local_guess(self, text: str):
+        """Return the hash of text, its memoized or locally identified language, and whether no fallback is needed."""
+        text_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            if text_hash in self._memo:
+                self._memo.move_to_end(text_hash)
+                return text_hash, self._memo[text_hash], True
+        language, confidence = identify_language(text)
+        if confidence >= self.threshold:
+            self.local_hits += 1
+            return text_hash, language, True
+        return text_hash, language, False
+
+    def _remember(self, text_hash: str, language: str) -> str:
+        if language not in supported_languages:
+            language = "English"
+        with self._lock:
+            self._memo[text_hash] = language
+            while len(self._memo) > self.max_entries:
+                self._memo.popitem(last=False)
+        return language
+
+
+# Process-wide detector shared by every Streamlit session.
+language_detector = LanguageDetector()
@@ -0,0 +1,295 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Exporter of the turn metrics: "" to disable them, "prometheus" for a text endpoint, "log" for JSON lines.
+METRICS_EXPORTER = os.environ.get("METRICS_EXPORTER", "").lower()
+# Port of the Prometheus text endpoint, served on every interface.
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9464"))
+# File the JSON lines are appended to, standard error when unset.
+METRICS_LOG_FILE = os.environ.get("METRICS_LOG_FILE", "")
+
+# Upper bounds, in seconds, of the buckets of the stage duration histograms.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Token counts read from the usage of a completion.
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+
+class TurnMetrics:
+    """
+    The stage durations and token usage of one turn, labelled with its model and persona.
+    Spans may be recorded from worker threads, the turn is handed to the exporter once it is finished.
+    """
+
+    enabled = True
+
+    def __init__(self, exporter, labels: dict):
+        self.exporter = exporter
+        self.labels = labels
+        self.durations = {}
+        self.usage = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        """Add seconds to the duration of a stage."""
+        with self._lock:
+            self.durations[stage] = self.durations.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time the body of a with statement as a stage of the turn."""
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def timed_stream(self, stage: str, iterator):
+        """
+        Yield the items of iterator, the time spent waiting on it is recorded as stage and the wait for its first item
+        as first_token, the time the caller spends on each item is not counted.
+        """
+        waited = 0.0
+        first = True
+        iterator = iter(iterator)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    waited += time.perf_counter() - start
+                if first:
+                    self.record("first_token", waited)
+                    first = False
+                yield item
+        finally:
+            self.record(stage, waited)
+
+    def add_usage(self, usage) -> None:
+        """Add the token counts of a completion usage, given as an object or a dict, to the turn."""
+        if usage is None:
+            return
+        with self._lock:
+            for field in USAGE_FIELDS:
+                count = usage.get(field) if isinstance(usage, dict) else getattr(usage, field, None)
+                if count:
+                    self.usage[field] = self.usage.get(field, 0) + int(count)
+
+    def finish(self) -> None:
+        """Hand the turn to the exporter."""
+        self.exporter.export(self)
+
+
+class _NullSpan:
+    """Reusable no-op context manager, so disabled spans allocate nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class NullTurnMetrics:
+    """Stand-in turn used when the metrics are disabled, every method returns at once."""
+
+    enabled = False
+    durations = {}
+    usage = {}
+    _span = _NullSpan()
+
+    def record(self, stage: str, seconds: float) -> None:
+        pass
+
+    def span(self, stage: str):
+        return self._span
+
+    def timed_stream(self, stage: str, iterator):
+        return iterator
+
+    def add_usage(self, usage) -> None:
+        pass
+
+    def finish(self) -> None:
+        pass
+
+
+null_turn = NullTurnMetrics()
+
+
+def completion_usage(response):
+    """
+    Return the token usage of a completion, or of a streamed chunk where Groq sends it in x_groq on the last chunk.
+    """
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        x_groq = getattr(response, "x_groq", None)
+        usage = x_groq.get("usage") if isinstance(x_groq, dict) else getattr(x_groq, "usage", None)
+    return usage
+
+
+def _format_labels(labels: dict) -> str:
+    return ",".join('%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                    for name, value in labels.items())
+
+
+class PrometheusExporter:
+    """
+    Aggregates finished turns into stage duration histograms and token counters,
+    served in the Prometheus text format by a daemon thread on METRICS_PORT.
+    """
+
+    def __init__(self, port: int = None):
+        self._histograms = {}
+        self._tokens = {}
+        self._turns = {}
+        self._lock = threading.Lock()
+        self.server = None
+        if port is not None:
+            self.server = self._serve(port)
+
+    def export(self, turn: TurnMetrics) -> None:
+        labels = tuple(turn.labels.items())
+        with self._lock:
+            self._turns[labels] = self._turns.get(labels, 0) + 1
+            for stage, seconds in turn.durations.items():
+                key = labels + (("stage", stage),)
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = [[0] * len(LATENCY_BUCKETS), 0.0, 0]
+                for index, bound in enumerate(LATENCY_BUCKETS):
+                    if seconds <= bound:
+                        histogram[0][index] += 1
+                histogram[1] += seconds
+                histogram[2] += 1
+            for field, count in turn.usage.items():
+                key = labels + (("kind", field.replace("_tokens", "")),)
+                self._tokens[key] = self._tokens.get(key, 0) + count
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        lines = [
+            "# HELP experts_turns_total Chat turns answered.",
+            "# TYPE experts_turns_total counter",
+        ]
+        with self._lock:
+            for labels, count in self._turns.items():
+                lines.append("experts_turns_total{%s} %d" % (_format_labels(dict(labels)), count))
+            lines.append("# HELP experts_stage_seconds Duration of each stage of a turn.")
+            lines.append("# TYPE experts_stage_seconds histogram")
+            for labels, (buckets, total, count) in self._histograms.items():
+                labels = dict(labels)
+                for bound, bucket_count in zip(LATENCY_BUCKETS, buckets):
+                    lines.append("experts_stage_seconds_bucket{%s} %d" % (_format_labels({**labels, "le": repr(bound)}), bucket_count))
+                lines.append("experts_stage_seconds_bucket{%s} %d" % (_format_labels({**labels, "le": "+Inf"}), count))
+                lines.append("experts_stage_seconds_sum{%s} %.6f" % (_format_labels(labels), total))
+                lines.append("experts_stage_seconds_count{%s} %d" % (_format_labels(labels), count))
+            lines.append("# HELP experts_tokens_total Tokens reported in the usage of the completions.")
+            lines.append("# TYPE experts_tokens_total counter")
+            for labels, count in self._tokens.items():
+                lines.append("experts_tokens_total{%s} %d" % (_format_labels(dict(labels)), count))
+        return "\n".join(lines) + "\n"
+
+    def _serve(self, port: int):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                body = exporter.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        try:
+            server = ThreadingHTTPServer(("", port), MetricsHandler)
+        except OSError as error:
+            # Another process of the host, such as a second Streamlit worker, already serves this port.
+            print("metrics: cannot serve Prometheus metrics on port %d: %s" % (port, error), file=sys.stderr)
+            return None
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+        return server
+
+
+class JSONLogExporter:
+    """
+    Writes one JSON line per finished turn, with its labels, stage durations in milliseconds and token usage.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+        self._lock = threading.Lock()
+
+    def export(self, turn: TurnMetrics) -> None:
+        line = json.dumps({
+            "ts": round(time.time(), 3),
+            **turn.labels,
+            "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in turn.durations.items()},
+            "usage": turn.usage,
+        })
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+class Metrics:
+    """
+    Entry point of the apps: start_turn returns the TurnMetrics of a turn, or null_turn when no exporter is configured.
+    """
+
+    def __init__(self, exporter=None):
+        self.exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def start_turn(self, **labels):
+        if self.exporter is None:
+            return null_turn
+        return TurnMetrics(self.exporter, labels)
+
+
+def create_metrics() -> Metrics:
+    """
+    This function builds the metrics of the process from METRICS_EXPORTER, METRICS_PORT and METRICS_LOG_FILE.
+    """
+    if METRICS_EXPORTER == "prometheus":
+        return Metrics(PrometheusExporter(METRICS_PORT))
+    if METRICS_EXPORTER == "log":
+        stream = open(METRICS_LOG_FILE, "a", encoding="utf-8") if METRICS_LOG_FILE else None
+        return Metrics(JSONLogExporter(stream))
+    if METRICS_EXPORTER:
+        raise ValueError("Unknown metrics exporter %r, expected prometheus or log" % METRICS_EXPORTER)
+    return Metrics()
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """
+    This function returns the process-wide metrics, created on first use so the Prometheus port is bound once per process.
+    """
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = create_metrics()
+    return _metrics
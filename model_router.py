@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+from collections import deque
+
+from groq_scheduler import get_scheduler
+from history import RESPONSE_TOKEN_RESERVE, context_window, estimate_tokens
+
+
+# Groq chat models offered in the sidebar, in their fallback order.
+MODELS = ['llama3-70b-8192', 'mixtral-8x7b-32768', 'llama3-8b-8192', 'gemma-7b-it']
+
+# Sidebar choice letting the router pick the fastest healthy model for each request.
+AUTO_MODEL = "auto"
+
+# Requests remembered per model for its latency and error rate.
+ROUTER_WINDOW = int(os.environ.get("ROUTER_WINDOW", "50"))
+# Models failing more often than this over the window only serve as a last resort.
+ROUTER_MAX_ERROR_RATE = float(os.environ.get("ROUTER_MAX_ERROR_RATE", "0.5"))
+# Consecutive failures putting a model aside, and for how many seconds.
+ROUTER_FAILURE_STREAK = int(os.environ.get("ROUTER_FAILURE_STREAK", "3"))
+ROUTER_COOLDOWN = float(os.environ.get("ROUTER_COOLDOWN", "30"))
+# Models tried for one request, the requested one and its fallbacks.
+ROUTER_MAX_ATTEMPTS = int(os.environ.get("ROUTER_MAX_ATTEMPTS", "3"))
+# Seconds a chat request may take, or wait between two streamed chunks, before it counts as failed.
+ROUTER_TIMEOUT = float(os.environ.get("ROUTER_TIMEOUT", "30"))
+
+
+class ModelStats:
+    """
+    The rolling latency and outcome of the last requests of one model.
+    The latency of a streamed request is its time to first token, the one of a plain request its full duration.
+    """
+
+    __slots__ = ("samples", "failure_streak", "cooldown_until")
+
+    def __init__(self, window: int = ROUTER_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.failure_streak = 0
+        self.cooldown_until = 0.0
+
+    def record(self, latency: float, ok: bool, now: float) -> None:
+        self.samples.append((latency, ok))
+        if ok:
+            self.failure_streak = 0
+        else:
+            self.failure_streak += 1
+            if self.failure_streak >= ROUTER_FAILURE_STREAK:
+                self.cooldown_until = now + ROUTER_COOLDOWN
+
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def latency(self) -> float:
+        """Return the 90th percentile latency of the successful requests, 0 for a model not measured yet so it gets tried."""
+        latencies = sorted(latency for latency, ok in self.samples if ok)
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(0.9 * len(latencies)))]
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.cooldown_until and self.error_rate() <= ROUTER_MAX_ERROR_RATE
+
+
+class ModelRouter:
+    """
+    Picks the model of each chat request and falls back to the next one when it fails or times out.
+    A request for a given model tries it first when it fits, then the other models in MODELS order; an "auto" request tries the
+    healthy models by rolling latency, counting the wait for a model throttled by the request scheduler.
+    Models whose context window cannot hold the prompt and the answer are never tried.
+    """
+
+    def __init__(self, models: list = MODELS, max_attempts: int = ROUTER_MAX_ATTEMPTS):
+        self.models = list(models)
+        # At least the first candidate is always tried.
+        self.max_attempts = max(max_attempts, 1)
+        self.fallbacks = 0
+        self._stats = {model: ModelStats() for model in self.models}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, latency: float, ok: bool) -> None:
+        with self._lock:
+            stats = self._stats.get(model)
+            if stats is None:
+                stats = self._stats[model] = ModelStats()
+            stats.record(latency, ok, time.monotonic())
+
+    def candidates(self, model: str, messages: list) -> list:
+        """Return the models to try for a request, in order."""
+        tokens = sum(estimate_tokens(str(message.get("content", ""))) for message in messages) + RESPONSE_TOKEN_RESERVE
+        fitting = [name for name in self.models if context_window(name) >= tokens]
+        if not fitting:
+            fitting = [max(self.models, key=context_window)]
+        now = time.monotonic()
+        scheduler = get_scheduler()
+        with self._lock:
+            def score(name):
+                stats = self._stats[name]
+                return (not stats.healthy(now), stats.latency() + max(scheduler.ready_at(name, tokens) - now, 0.0))
+
+            if model == AUTO_MODEL:
+                ordered = sorted(fitting, key=score)
+            else:
+                ordered = ([model] if model in fitting else []) + sorted((name for name in fitting if name != model),
+                                                                         key=lambda name: score(name)[0])
+        return ordered[:self.max_attempts]
+
+    def complete(self, model: str, messages: list, request, on_model=None):
+        """
+        This function returns request(routed_model), a callable sending the chat request to the given model,
+        trying the next candidate when it raises. The model that answered is passed to on_model when it is given.
+        """
+        last_error = None
+        for routed_model in self.candidates(model, messages):
+            start = time.perf_counter()
+            try:
+                result = request(routed_model)
+            except Exception as error:
+                self.record(routed_model, time.perf_counter() - start, False)
+                self.fallbacks += 1
+                last_error = error
+                continue
+            self.record(routed_model, time.perf_counter() - start, True)
+            if on_model:
+                on_model(routed_model)
+            return result
+        raise last_error
+
+    def stream(self, model: str, messages: list, open_stream, on_model=None):
+        """
+        This function yields the answer of open_stream(routed_model), a generator of text deltas for the given model.
+        The next candidate is tried when a stream fails before its first delta, once text is shown the stream is kept.
+        The model that answered is passed to on_model when it is given.
+        """
+        last_error = None
+        for routed_model in self.candidates(model, messages):
+            start = time.perf_counter()
+            deltas = iter(open_stream(routed_model))
+            try:
+                first = next(deltas)
+            except StopIteration:
+                self.record(routed_model, time.perf_counter() - start, True)
+                if on_model:
+                    on_model(routed_model)
+                return
+            except Exception as error:
+                self.record(routed_model, time.perf_counter() - start, False)
+                self.fallbacks += 1
+                last_error = error
+                continue
+            self.record(routed_model, time.perf_counter() - start, True)
+            if on_model:
+                on_model(routed_model)
+            yield first
+            yield from deltas
+            return
+        raise last_error
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                model: {"latency_p90": stats.latency(), "error_rate": stats.error_rate(), "healthy": stats.healthy(now)}
+                for model, stats in self._stats.items()
+            }
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """
+    This function returns the process-wide model router, creating it on first use.
+    """
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter()
+    return _router
@@ -0,0 +1,80 @@
+import json
+import os
+import threading
+import time
+
+
+# Data file of the expert catalog, overridable from the environment.
+PERSONAS_FILE = os.environ.get("PERSONAS_FILE", "personas.json")
+
+# How often, in seconds, the store checks the modification time of its file.
+RELOAD_CHECK_INTERVAL = 5.0
+
+
+class Persona:
+    """
+    One expert of the catalog: its id, the title shown in the sidebar and the system prompt in name.
+    """
+
+    __slots__ = ("id", "title", "name")
+
+    def __init__(self, id: str, title: str, name: str):
+        self.id = id
+        self.title = title
+        self.name = name
+
+    def __repr__(self):
+        return "Persona(id=%r, title=%r)" % (self.id, self.title)
+
+
+class PersonaStore:
+    """
+    The expert catalog loaded once per process from a JSON file and shared read-only by every session.
+    The file is read again when its modification time changes, so personas are added without editing the app.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._personas = ()
+        self._by_id = {}
+        self._by_title = {}
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def personas(self) -> tuple:
+        """Return every persona in catalog order."""
+        self._reload_if_changed()
+        return self._personas
+
+    def get(self, persona_id: str) -> Persona:
+        """Return the persona with the given id, or None."""
+        self._reload_if_changed()
+        return self._by_id.get(persona_id)
+
+    def by_title(self, title: str) -> Persona:
+        """Return the persona with the given sidebar title, or None."""
+        self._reload_if_changed()
+        return self._by_title.get(title)
+
+    def _reload_if_changed(self) -> None:
+        now = time.monotonic()
+        if self._mtime is not None and now - self._checked_at < RELOAD_CHECK_INTERVAL:
+            return
+        with self._lock:
+            if self._mtime is not None and now - self._checked_at < RELOAD_CHECK_INTERVAL:
+                return
+            mtime = os.stat(self.file_path).st_mtime
+            if mtime != self._mtime:
+                with open(self.file_path, 'r', encoding='utf-8') as f:
+                    records = json.load(f)
+                personas = tuple(Persona(str(record["id"]), record["title"], record["name"]) for record in records)
+                self._by_id = {persona.id: persona for persona in personas}
+                self._by_title = {persona.title: persona for persona in personas}
+                self._personas = personas
+                self._mtime = mtime
+            self._checked_at = now
+
+
+# Process-wide catalog shared by every Streamlit session.
+persona_store = PersonaStore(PERSONAS_FILE)
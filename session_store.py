@@ -0,0 +1,225 @@
+import os
+import sqlite3
+import struct
+import threading
+import uuid
+from collections import OrderedDict
+
+from history import HISTORY_ARCHIVE, HISTORY_WINDOW, ConversationHistory, TranscriptArchive
+
+
+# Kinds of the records of a session log.
+TURN_RECORD = 1
+CLEAR_RECORD = 2
+SUMMARY_RECORD = 3
+
+FIELD_LENGTH = struct.Struct("<I")
+
+
+def encode_record(kind: int, *fields: str) -> bytes:
+    """
+    This function encodes a log record as its kind byte followed by each field as a 4-byte length and UTF-8 bytes.
+    """
+    parts = [bytes((kind,))]
+    for field in fields:
+        data = field.encode("utf-8")
+        parts.append(FIELD_LENGTH.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def decode_record(record: bytes):
+    """
+    This function decodes a log record into its kind and the tuple of its fields.
+    """
+    fields = []
+    offset = 1
+    while offset < len(record):
+        (length,) = FIELD_LENGTH.unpack_from(record, offset)
+        offset += FIELD_LENGTH.size
+        fields.append(bytes(record[offset:offset + length]).decode("utf-8"))
+        offset += length
+    return record[0], tuple(fields)
+
+
+class SessionState:
+    """
+    The conversation of one session, rebuilt by replaying its log as a token-budgeted ConversationHistory with its running summary.
+    It keeps the newest HISTORY_WINDOW turns in ring buffers, the rest of the transcript is only kept
+    compressed when HISTORY_ARCHIVE is set.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.conversation = ConversationHistory(HISTORY_WINDOW, TranscriptArchive() if HISTORY_ARCHIVE else None)
+        self.clear()
+        # Sequence number of the last record applied, used by the SQLite backend to replay only newer records.
+        self.last_seq = 0
+
+    def apply(self, kind: int, fields: tuple) -> None:
+        if kind == TURN_RECORD:
+            self.conversation.add_turn(*fields)
+        elif kind == CLEAR_RECORD:
+            self.clear()
+        elif kind == SUMMARY_RECORD:
+            summarized_turns, summary = fields
+            self.conversation.set_summary(summary, int(summarized_turns))
+
+    def clear(self) -> None:
+        self.conversation.clear()
+
+
+class MemorySessionStore:
+    """
+    In-process backend, sessions are lost when the process stops and are only visible to its own replica.
+    The least recently used sessions are dropped past max_sessions.
+    """
+
+    def __init__(self, max_sessions: int = 10000):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str) -> SessionState:
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = self._sessions[session_id] = SessionState(session_id)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return state
+
+    def get(self, session_id: str) -> SessionState:
+        """Return the state of a known session, or None without creating one."""
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def _append(self, session_id: str, kind: int, *fields: str) -> None:
+        state = self.load(session_id)
+        with self._lock:
+            state.apply(kind, fields)
+
+    def append_turn(self, session_id: str, user_question: str, chatbot_answer: str) -> None:
+        self._append(session_id, TURN_RECORD, user_question, chatbot_answer)
+
+    def set_summary(self, session_id: str, summarized_turns: int, summary: str) -> None:
+        self._append(session_id, SUMMARY_RECORD, str(summarized_turns), summary)
+
+    def clear(self, session_id: str) -> None:
+        self._append(session_id, CLEAR_RECORD)
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+
+class SQLiteSessionStore:
+    """
+    On-disk backend shared by every process and replica using the same database file, conversations survive restarts.
+    Each session is an append-only log of binary records, a clear record compacts the log by deleting the records before it.
+    Replayed sessions are cached up to max_cached, a load only reads the records appended since the cached state.
+    """
+
+    def __init__(self, path: str, max_cached: int = 1024):
+        self.max_cached = max_cached
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS session_log ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, record BLOB NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS session_log_session ON session_log (session_id, seq)")
+
+    def load(self, session_id: str) -> SessionState:
+        with self._lock:
+            state = self._cache.get(session_id)
+            if state is None:
+                state = self._cache[session_id] = SessionState(session_id)
+            self._cache.move_to_end(session_id)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+            rows = self._connection.execute(
+                "SELECT seq, record FROM session_log WHERE session_id = ? AND seq > ? ORDER BY seq",
+                (session_id, state.last_seq),
+            ).fetchall()
+            for seq, record in rows:
+                state.apply(*decode_record(record))
+                state.last_seq = seq
+            return state
+
+    def get(self, session_id: str) -> SessionState:
+        """Return the state of a session with records, or None without caching anything."""
+        with self._lock:
+            known = session_id in self._cache or self._connection.execute(
+                "SELECT 1 FROM session_log WHERE session_id = ? LIMIT 1", (session_id,)).fetchone() is not None
+        return self.load(session_id) if known else None
+
+    def _append(self, session_id: str, kind: int, *fields: str) -> None:
+        with self._lock:
+            self._connection.execute("INSERT INTO session_log (session_id, record) VALUES (?, ?)",
+                                     (session_id, encode_record(kind, *fields)))
+        # The record is applied to the cached state by replaying it, so records of other replicas keep their order.
+        self.load(session_id)
+
+    def append_turn(self, session_id: str, user_question: str, chatbot_answer: str) -> None:
+        self._append(session_id, TURN_RECORD, user_question, chatbot_answer)
+
+    def set_summary(self, session_id: str, summarized_turns: int, summary: str) -> None:
+        self._append(session_id, SUMMARY_RECORD, str(summarized_turns), summary)
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            cursor = self._connection.execute("INSERT INTO session_log (session_id, record) VALUES (?, ?)",
+                                              (session_id, encode_record(CLEAR_RECORD)))
+            self._connection.execute("DELETE FROM session_log WHERE session_id = ? AND seq < ?",
+                                     (session_id, cursor.lastrowid))
+        self.load(session_id)
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            self._cache.pop(session_id, None)
+            cursor = self._connection.execute("DELETE FROM session_log WHERE session_id = ?", (session_id,))
+            return cursor.rowcount > 0
+
+
+def create_session_store():
+    """
+    This function builds the session store from the environment:
+    SESSION_STORE_BACKEND is "memory" (default) or "sqlite", stored at SESSION_STORE_PATH,
+    and SESSION_STORE_MAX_SESSIONS bounds the sessions kept in memory.
+    """
+    max_sessions = int(os.environ.get("SESSION_STORE_MAX_SESSIONS", "10000"))
+    if os.environ.get("SESSION_STORE_BACKEND", "memory") == "sqlite":
+        return SQLiteSessionStore(os.environ.get("SESSION_STORE_PATH", "sessions.sqlite3"), max_sessions)
+    return MemorySessionStore(max_sessions)
+
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """
+    This function returns the process-wide session store, creating it on first use.
+    """
+    global _session_store
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                _session_store = create_session_store()
+    return _session_store
+
+
+def streamlit_session_id(st) -> str:
+    """
+    This function returns the id of the conversation of a Streamlit browser session.
+    It is kept in the "session" query parameter of the page, so a reload, a restart or another replica finds the same conversation.
+    """
+    session_id = st.query_params.get("session")
+    if not session_id:
+        session_id = uuid.uuid4().hex
+        st.query_params["session"] = session_id
+    return session_id
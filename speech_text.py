@@ -0,0 +1,74 @@
+import re
+
+
+# Every markdown construct that should not be read aloud, matched by a single alternation so the answer is scanned once.
+SPEECH_PATTERN = re.compile(
+    r"(?P<fence>(?s:```.*?(?:```|\Z)))"
+    r"|(?P<math_block>(?s:\$\$.*?\$\$|\\\[.*?\\\]))"
+    r"|(?P<math_inline>\\\(.*?\\\)|\$(?=\S)[^$\n]*\\[^$\n]*(?<=\S)\$)"
+    r"|(?P<code>`(?P<code_text>[^`\n]+)`)"
+    r"|(?P<image>!\[(?P<image_text>[^\]\n]*)\]\([^)\n]*\))"
+    r"|(?P<link>\[(?P<link_text>[^\]\n]+)\]\([^)\n]*\))"
+    r"|(?P<url>https?://\S+|www\.\S+)"
+    r"|(?P<html></?[a-zA-Z][^>\n]*>)"
+    r"|(?P<table_rule>^[ \t]*\|?[ \t]*:?-{3,}[-:| \t]*$)"
+    r"|(?P<line_marker>^[ \t]*(?:#{1,6}|>|[-+*](?=[ \t])))"
+    r"|(?P<marks>[*_`~#|\"“”]+)"
+    r"|(?P<quote>(?<!\w)'|'(?!\w))",
+    re.MULTILINE,
+)
+
+# Constructs whose text is kept while their markup is dropped.
+KEPT_TEXT = {"code": "code_text", "image": "image_text", "link": "link_text"}
+
+
+def _speech_replacement(match) -> str:
+    kind = match.lastgroup
+    if kind in KEPT_TEXT:
+        return match.group(KEPT_TEXT[kind])
+    return " "
+
+
+def to_speech_text(text: str) -> str:
+    """
+    This function turns a markdown answer into speakable text in one linear pass:
+    code blocks, LaTeX, URLs, HTML tags and table rules are dropped, links and inline code keep their text,
+    and emphasis, heading, quote and table marks become spaces. Apostrophes inside words are kept.
+    """
+    return SPEECH_PATTERN.sub(_speech_replacement, text)
+
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;:。！？])\s+|\n+")
+
+# Choices of how much of an answer is read aloud, shown in the sidebar.
+AUDIO_POLICIES = ("Full answer", "First sentences", "Character budget", "Time budget")
+
+# Average speaking rate used to turn a time budget into a character budget.
+SPOKEN_CHARS_PER_SECOND = 15
+
+
+def _cut_at_boundary(text: str, max_chars: int) -> str:
+    """Cut text to at most max_chars, at the last sentence end, or else the last word end, before the limit."""
+    if len(text) <= max_chars:
+        return text
+    head = text[:max_chars]
+    sentence_end = max(head.rfind(mark) for mark in ".!?。！？")
+    if sentence_end > max_chars // 2:
+        return head[:sentence_end + 1]
+    word_end = head.rfind(" ")
+    return head[:word_end] if word_end > 0 else head
+
+
+def apply_audio_policy(text: str, policy: str = "Full answer", limit: int = 0) -> str:
+    """
+    This function bounds the text sent to speech synthesis according to the audio policy:
+    the full answer, its first limit sentences, at most limit characters, or about limit seconds of speech.
+    """
+    if policy == "First sentences":
+        sentences = [sentence for sentence in SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+        return " ".join(sentences[:max(limit, 1)])
+    if policy == "Character budget":
+        return _cut_at_boundary(text, max(limit, 1))
+    if policy == "Time budget":
+        return _cut_at_boundary(text, max(limit, 1) * SPOKEN_CHARS_PER_SECOND)
+    return text
@@ -0,0 +1,68 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Cheap model folding the turns that left the prompt window into the running summary of a conversation.
+SUMMARY_MODEL = os.environ.get("SUMMARY_MODEL", "llama3-8b-8192")
+SUMMARY_MAX_WORDS = int(os.environ.get("SUMMARY_MAX_WORDS", "150"))
+
+SUMMARY_INSTRUCTION = (
+    "You maintain the running summary of a conversation between a human and an AI assistant. "
+    "Fold the new turns into the summary, keeping names, facts, preferences, decisions and open questions. "
+    "Answer with the updated summary only, in at most {max_words} words."
+)
+
+# Process-wide pool running the summaries off the Streamlit script thread and off the audio pool.
+summary_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("SUMMARY_WORKERS", "2")),
+    thread_name_prefix="summary",
+)
+
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def summarize_turns(client, summary: str, lines: list) -> str:
+    """
+    This function asks the summary model for the running summary updated with the given "Human: ...\\nAI: ..." turn lines.
+    """
+    content = "Running summary:\n" + (summary or "(empty)") + "\n\nNew turns:\n" + "\n".join(lines)
+    response = client.chat.completions.create(
+        model=SUMMARY_MODEL,
+        messages=[{"role": "system", "content": SUMMARY_INSTRUCTION.format(max_words=SUMMARY_MAX_WORDS)},
+                  {"role": "user", "content": content}],
+        temperature=0,
+    )
+    return response.choices[0].message.content.strip()
+
+
+def _summarize_session(client, session_store, session_id: str, summary: str, lines: list, summarized_turns: int) -> str:
+    try:
+        summary = summarize_turns(client, summary, lines)
+        session_store.set_summary(session_id, summarized_turns, summary)
+        return summary
+    finally:
+        with _pending_lock:
+            _pending.discard(session_id)
+
+
+def schedule_summary(client, session_store, session_id: str):
+    """
+    This function folds the turns of a session that fell out of its last prompt window into its running summary,
+    on the summary pool so the turn never waits for it. The next prompt of the session carries the updated summary.
+    It returns the Future of the job, or None when nothing is left to summarize or a job of the session is still running.
+    """
+    # The slot of the session is claimed first, so the turns are never read while a job of the session updates the summary.
+    with _pending_lock:
+        if session_id in _pending:
+            return None
+        _pending.add(session_id)
+    conversation = session_store.load(session_id).conversation
+    lines, summarized_turns = conversation.turns_to_summarize()
+    if not lines:
+        with _pending_lock:
+            _pending.discard(session_id)
+        return None
+    return summary_executor.submit(_summarize_session, client, session_store, session_id,
+                                   conversation.summary, lines, summarized_turns)
@@ -0,0 +1,198 @@
+import asyncio
+import io
+import os
+import random
+import subprocess
+import threading
+import wave
+
+from async_pipeline import synthesize_in_segments_async
+from audio_pipeline import synthesize_in_segments
+from language_dict import language_dict
+from languages import supported_languages
+from tts_cache import tts_cache
+
+
+class TTSBackend:
+    """
+    A text to speech engine behind the common API of the apps.
+    Backends implement select_voice and synthesize for one segment of text, the base class splits long texts into segments,
+    synthesizes them in parallel, caches each segment and joins the audio.
+    """
+
+    name = "base"
+    mime_type = "audio/mpeg"
+
+    def select_voice(self, language: str, accent: str = None) -> str:
+        """Return the voice used for a language name of supported_languages and an optional accent."""
+        raise NotImplementedError
+
+    def synthesize(self, text: str, language: str, voice: str) -> bytes:
+        """Return the audio of one segment of text."""
+        raise NotImplementedError
+
+    async def synthesize_async(self, text: str, language: str, voice: str) -> bytes:
+        """Coroutine version of synthesize, blocking engines run on a worker thread."""
+        return await asyncio.to_thread(self.synthesize, text, language, voice)
+
+    def join(self, parts: list) -> bytes:
+        """Join the audio of consecutive segments, mp3 frames can simply be concatenated."""
+        return b"".join(parts)
+
+    def _cache_voice(self, voice: str) -> str:
+        return self.name + ":" + voice
+
+    def convert_text_to_audio(self, text: str, language: str, accent: str = None) -> bytes:
+        """Convert the given text to audio
+        :type text: str
+        :param text: Text to convert to audio
+        :type language: str
+        :param language: Language name, a key of supported_languages
+        :type accent: str
+        :param accent: Localization accent, when the backend supports one
+        :rtype: bytes
+        :returns: The audio, in the mime_type format of the backend
+        """
+        voice = self.select_voice(language, accent)
+
+        def cached_synthesize(segment):
+            return tts_cache.get_or_synthesize(segment, language, self._cache_voice(voice),
+                                               lambda: self.synthesize(segment, language, voice))
+
+        return synthesize_in_segments(text, cached_synthesize, join=self.join)
+
+    async def convert_text_to_audio_async(self, text: str, language: str, accent: str = None) -> bytes:
+        """Coroutine version of convert_text_to_audio, for the process-wide event loop."""
+        voice = self.select_voice(language, accent)
+
+        async def cached_synthesize(segment):
+            key = tts_cache.key(segment, language, self._cache_voice(voice))
+            audio = tts_cache.get(key)
+            if audio is None:
+                audio = await self.synthesize_async(segment, language, voice)
+                tts_cache.put(key, audio)
+            return audio
+
+        return await synthesize_in_segments_async(text, cached_synthesize, join=self.join)
+
+
+class GTTSBackend(TTSBackend):
+    """
+    Google Translate text to speech, the accent is the Google domain tld of AccentList.
+    """
+
+    name = "gtts"
+
+    def select_voice(self, language: str, accent: str = None) -> str:
+        return accent or "com"
+
+    def synthesize(self, text: str, language: str, voice: str) -> bytes:
+        from gtts import gTTS
+
+        tts = gTTS(text, lang=supported_languages[language], tld=voice, lang_check=True, slow=False)
+        mp3_buffer = io.BytesIO()
+        tts.write_to_fp(mp3_buffer)
+        return mp3_buffer.getvalue()
+
+
+class EdgeTTSBackend(TTSBackend):
+    """
+    Microsoft Edge neural voices, a male or female voice of language_dict is picked at random for each answer.
+    """
+
+    name = "edge-tts"
+    genders = ["-M", "-F"]
+
+    def select_voice(self, language: str, accent: str = None) -> str:
+        return language_dict.get(language + random.choice(self.genders), "default_voice")
+
+    def synthesize(self, text: str, language: str, voice: str) -> bytes:
+        return asyncio.run(self.synthesize_async(text, language, voice))
+
+    async def synthesize_async(self, text: str, language: str, voice: str) -> bytes:
+        import edge_tts
+
+        mp3_buffer = bytearray()
+        async for chunk in edge_tts.Communicate(text, voice).stream():
+            if chunk["type"] == "audio":
+                mp3_buffer.extend(chunk["data"])
+        return bytes(mp3_buffer)
+
+
+class EspeakBackend(TTSBackend):
+    """
+    Local espeak-ng subprocess, no network access at all. Produces wav audio.
+    The command is read from ESPEAK_COMMAND, so a piper-style wrapper accepting the same arguments can replace it.
+    """
+
+    name = "espeak"
+    mime_type = "audio/wav"
+    # Language codes of supported_languages that espeak-ng names differently.
+    voices = {"iw": "he", "zh-CN": "cmn"}
+
+    def __init__(self, command: str = None):
+        self.command = command or os.environ.get("ESPEAK_COMMAND", "espeak-ng")
+
+    def select_voice(self, language: str, accent: str = None) -> str:
+        code = supported_languages.get(language, "en")
+        return self.voices.get(code, code)
+
+    def synthesize(self, text: str, language: str, voice: str) -> bytes:
+        # "--" ends the options, so a text starting with "-" is never read as one, and espeak-ng never reads the server's stdin.
+        result = subprocess.run([self.command, "-v", voice, "--stdout", "--", text],
+                                stdin=subprocess.DEVNULL, capture_output=True, check=True)
+        return result.stdout
+
+    async def synthesize_async(self, text: str, language: str, voice: str) -> bytes:
+        process = await asyncio.create_subprocess_exec(
+            self.command, "-v", voice, "--stdout", "--", text,
+            stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await process.communicate()
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, self.command, stdout, stderr)
+        return stdout
+
+    def join(self, parts: list) -> bytes:
+        """Join wav segments by copying their frames under a single header."""
+        if len(parts) <= 1:
+            return parts[0] if parts else b""
+        output = io.BytesIO()
+        with wave.open(output, "wb") as joined:
+            for index, part in enumerate(parts):
+                with wave.open(io.BytesIO(part), "rb") as segment:
+                    if index == 0:
+                        joined.setparams(segment.getparams())
+                    joined.writeframes(segment.readframes(segment.getnframes()))
+        return output.getvalue()
+
+
+TTS_BACKENDS = {
+    GTTSBackend.name: GTTSBackend,
+    EdgeTTSBackend.name: EdgeTTSBackend,
+    EspeakBackend.name: EspeakBackend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def register_tts_backend(backend: TTSBackend) -> None:
+    """
+    This function makes a backend instance available to get_tts_backend under its name, such as a stand-in for benchmarks.
+    """
+    with _backends_lock:
+        _backends[backend.name] = backend
+
+
+def get_tts_backend(name: str) -> TTSBackend:
+    """
+    This function returns the process-wide backend registered under name in TTS_BACKENDS: "gtts", "edge-tts" or "espeak".
+    """
+    backend = _backends.get(name)
+    if backend is None:
+        if name not in TTS_BACKENDS:
+            raise ValueError("Unknown TTS backend %r, expected one of %s" % (name, ", ".join(TTS_BACKENDS)))
+        with _backends_lock:
+            backend = _backends.setdefault(name, TTS_BACKENDS[name]())
+    return backend
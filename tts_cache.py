@@ -0,0 +1,139 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized mp3 audio.
+    Entries are keyed on the normalized text, the language code and the accent tld or voice,
+    kept in memory in least-recently-used order up to a byte budget, and optionally spilled
+    to a directory on disk when they are evicted from memory.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, cache_dir: str = None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str, language: str, voice: str) -> str:
+        """Build the cache key of a synthesis request
+        :type text: str
+        :param text: Text to convert to audio, whitespace is normalized before hashing
+        :type language: str
+        :param language: Language code
+        :type voice: str
+        :param voice: Accent tld or voice name
+        :rtype: str
+        :returns: Hex digest identifying the audio
+        """
+        normalized = " ".join(text.split())
+        return hashlib.sha256("\0".join((normalized, language or "", voice or "")).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> bytes:
+        """Return the cached audio for key, or None when it is not cached."""
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return audio
+        audio = self._read_spilled(key)
+        with self._lock:
+            if audio is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self.put(key, audio)
+        return audio
+
+    def put(self, key: str, audio: bytes) -> None:
+        """Store audio under key, evicting the least recently used entries past the byte budget."""
+        if len(audio) > self.max_bytes:
+            self._spill(key, audio)
+            return
+        evicted = []
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = audio
+            self._size += len(audio)
+            while self._size > self.max_bytes:
+                old_key, old_audio = self._entries.popitem(last=False)
+                self._size -= len(old_audio)
+                evicted.append((old_key, old_audio))
+        for old_key, old_audio in evicted:
+            self._spill(old_key, old_audio)
+
+    def get_or_synthesize(self, text: str, language: str, voice: str, synthesize) -> bytes:
+        """Return the cached audio of a request, calling synthesize() to produce it on a miss
+        :type synthesize: callable
+        :param synthesize: Function without arguments returning the mp3 bytes
+        :rtype: bytes
+        :returns: The mp3 audio
+        """
+        key = self.key(text, language, voice)
+        audio = self.get(key)
+        if audio is None:
+            audio = synthesize()
+            self.put(key, audio)
+        return audio
+
+    def stats(self) -> dict:
+        """Return the hit and miss counters and the current memory usage."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+    def clear(self) -> None:
+        """Drop every in-memory entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def _spill_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".mp3")
+
+    def _spill(self, key: str, audio: bytes) -> None:
+        if not self.cache_dir:
+            return
+        path = self._spill_path(key)
+        if os.path.exists(path):
+            return
+        # The directory is created on the first spill, so importing the cache never touches the disk.
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = "%s.%d.tmp" % (path, threading.get_ident())
+        with open(tmp_path, "wb") as mp3_file:
+            mp3_file.write(audio)
+        os.replace(tmp_path, path)
+
+    def _read_spilled(self, key: str) -> bytes:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._spill_path(key), "rb") as mp3_file:
+                return mp3_file.read()
+        except FileNotFoundError:
+            return None
+
+
+# Process-wide cache shared by every Streamlit session.
+tts_cache = TTSCache(
+    max_bytes=int(os.environ.get("TTS_CACHE_MAX_MB", "32")) * 1024 * 1024,
+    cache_dir=os.environ.get("TTS_CACHE_DIR") or None,
+)